@@ -0,0 +1,356 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Benchmarks of machine dialog parser.
+
+Usage: python -m benchmarks.run [--events N] [--output results.json]
+
+Results are written as JSON, so they can be compared between revisions.
+"""
+
+
+import os
+import io
+import sys
+import pty
+import json
+import time
+import argparse
+import platform
+import threading
+import collections
+from otopimdp import constants as c
+from otopimdp import errors
+from otopimdp import utils
+from otopimdp.parser import MachineDialogParser
+from otopimdp.logsink import RingLogSink
+from benchmarks import transcript
+
+
+timer = getattr(time, 'perf_counter', time.time)
+
+REPLIES = {
+    c.QUERY_STRING_EVENT: 'value',
+    c.QUERY_MULTI_STRING_EVENT: ['value'],
+    c.QUERY_VALUE_EVENT: 'value',
+    c.CONFIRM_EVENT: True,
+}
+
+# events of typical consumer which only answers queries
+SUBSCRIBED = (
+    c.QUERY_STRING_EVENT,
+    c.QUERY_MULTI_STRING_EVENT,
+    c.QUERY_VALUE_EVENT,
+    c.CONFIRM_EVENT,
+    c.TERMINATE_EVENT,
+)
+
+
+class Transport(object):
+    """
+    Opens input stream of parser which provides given data by
+    open(data, binary=False).
+    """
+
+    name = None
+
+    def close(self):
+        pass
+
+
+class StringIOTransport(Transport):
+
+    name = 'stringio'
+
+    def open(self, data, binary=False):
+        if binary:
+            return io.BytesIO(data.encode('utf-8'))
+        return io.StringIO(data)
+
+
+class _ThreadTransport(Transport):
+    """
+    Writes data into file descriptor from separate thread.
+    """
+
+    def _start(self, write_fd, data):
+        def writer():
+            with os.fdopen(write_fd, 'wb') as stream:
+                stream.write(data.encode('utf-8'))
+
+        self._thread = threading.Thread(target=writer)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._thread.join()
+
+
+class PipeTransport(_ThreadTransport):
+
+    name = 'pipe'
+
+    def open(self, data, binary=False):
+        read_fd, write_fd = os.pipe()
+        self._start(write_fd, data)
+        return os.fdopen(read_fd, 'rb' if binary else 'r')
+
+
+class PtyTransport(_ThreadTransport):
+    """
+    Installer writes into slave side of pty, the line discipline turns
+    newlines into '\\r\\n' as in real terminal.
+    """
+
+    name = 'pty'
+
+    def open(self, data, binary=False):
+        master_fd, slave_fd = pty.openpty()
+        self._start(slave_fd, data)
+        return os.fdopen(master_fd, 'rb' if binary else 'r')
+
+
+TRANSPORTS = dict(
+    (transport.name, transport) for transport in (
+        StringIOTransport,
+        PipeTransport,
+        PtyTransport,
+    )
+)
+
+
+def drive(parser):
+    """
+    Reads all events of transcript and replies to queries, returns
+    statistics per event type.
+    """
+    stats = collections.defaultdict(lambda: [0, 0.0])
+    while True:
+        start = timer()
+        event = parser.next_event()
+        elapsed = timer() - start
+        if event is None:
+            stat = stats['unmatched']
+        else:
+            stat = stats[event[c.TYPE_KEY]]
+        stat[0] += 1
+        stat[1] += elapsed
+        if event is None:
+            continue
+        event_type = event[c.TYPE_KEY]
+        if event_type == c.TERMINATE_EVENT:
+            return stats
+        if event_type in REPLIES:
+            valid = event[c.ATTRIBUTES_KEY].get(c.VALID_VALUES_KEY)
+            event[c.REPLY_KEY] = valid[0] if valid else REPLIES[event_type]
+            parser.send_response(event)
+
+
+def bench_events(name, data, transport, repeat, **kwargs):
+    """
+    Measures next_event over whole transcript, parser is in bytes mode
+    when encoding is passed in kwargs.
+    """
+    binary = kwargs.get('encoding') is not None
+    output = io.BytesIO if binary else io.StringIO
+    best = None
+    for _ in range(repeat):
+        transport_ = TRANSPORTS[transport]()
+        input_ = transport_.open(data, binary)
+        parser = MachineDialogParser(input_, output(), **kwargs)
+        start = timer()
+        stats = drive(parser)
+        seconds = timer() - start
+        input_.close()
+        transport_.close()
+        if best is None or seconds < best[0]:
+            best = (seconds, stats)
+    seconds, stats = best
+
+    # python 3.4+, the module is imported here so drive() works on older
+    import tracemalloc
+    tracemalloc.start()
+    transport_ = TRANSPORTS[transport]()
+    input_ = transport_.open(data, binary)
+    drive(MachineDialogParser(input_, output(), **kwargs))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    input_.close()
+    transport_.close()
+
+    events = sum(count for count, _ in stats.values())
+    size = len(data.encode('utf-8'))
+    return {
+        'name': name,
+        'transport': transport,
+        'events': events,
+        'bytes': size,
+        'seconds': seconds,
+        'events_per_sec': events / seconds,
+        'bytes_per_sec': size / seconds,
+        'peak_memory': peak,
+        'per_event_type': dict(
+            (event_type, {
+                'count': count,
+                'seconds': elapsed,
+                'usec_per_event': elapsed / count * 1e6,
+            })
+            for event_type, (count, elapsed) in sorted(stats.items())
+        ),
+    }
+
+
+def bench_next_line(data, repeat):
+    """
+    Measures next_line over whole transcript.
+    """
+    best = None
+    for _ in range(repeat):
+        parser = MachineDialogParser(io.StringIO(data), io.StringIO())
+        lines = 0
+        start = timer()
+        try:
+            while True:
+                parser.next_line()
+                lines += 1
+        except errors.UnexpectedEOF:
+            pass
+        seconds = timer() - start
+        if best is None or seconds < best:
+            best = seconds
+    size = len(data.encode('utf-8'))
+    return {
+        'name': 'next_line',
+        'transport': StringIOTransport.name,
+        'lines': lines,
+        'bytes': size,
+        'seconds': best,
+        'lines_per_sec': lines / best,
+        'bytes_per_sec': size / best,
+    }
+
+
+def bench_split_valid_options(options, repeat):
+    """
+    Measures utils.split_valid_options on QValidValues with given number
+    of escaped options, frames of parsers use memoized utils.valid_options.
+    """
+    string = '|'.join('option\\|%d' % i for i in range(options))
+    number = 1000
+    best = None
+    for _ in range(repeat):
+        start = timer()
+        for _ in range(number):
+            utils.split_valid_options(string)
+        seconds = timer() - start
+        if best is None or seconds < best:
+            best = seconds
+    return {
+        'name': 'split_valid_options',
+        'options': options,
+        'calls': number,
+        'seconds': best,
+        'usec_per_call': best / number * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--transport', action='append', choices=sorted(TRANSPORTS),
+        help="transports to measure, all by default",
+    )
+    parser.add_argument('--output', help="file for results, default stdout")
+    args = parser.parse_args()
+    transports = args.transport or sorted(TRANSPORTS)
+
+    scenarios = {
+        'mixed': transcript.generate(events=args.events),
+        'log': transcript.generate(
+            events=args.events, log_ratio=1.0, long_line_ratio=0,
+        ),
+        'frames': transcript.generate(
+            events=args.events // 10, log_ratio=0, note_ratio=0,
+            frame_ratio=1.0,
+        ),
+        'multi_string': transcript.generate(
+            events=10, log_ratio=0, note_ratio=0, frame_ratio=0,
+            multi_string_ratio=1.0, multi_string_lines=args.events * 10,
+        ),
+        'long_lines': transcript.generate(
+            events=args.events // 100, log_ratio=1.0, long_line_ratio=1.0,
+            long_line_length=1024 * 1024,
+        ),
+    }
+
+    results = [bench_next_line(scenarios['mixed'], args.repeat)]
+    for name, data in sorted(scenarios.items()):
+        for transport in transports:
+            results.append(bench_events(name, data, transport, args.repeat))
+    results.append(
+        bench_events(
+            'multi_string_streamed', scenarios['multi_string'],
+            StringIOTransport.name, args.repeat, stream_multi_string=True,
+        )
+    )
+    for name in ('mixed', 'log'):
+        for transport in transports:
+            results.append(
+                bench_events(
+                    name + '_bytes', scenarios[name], transport, args.repeat,
+                    encoding='utf-8',
+                )
+            )
+    for transport in transports:
+        results.append(
+            bench_events(
+                'mixed_subscribed', scenarios['mixed'], transport,
+                args.repeat, subscribed=SUBSCRIBED,
+            )
+        )
+    for transport in transports:
+        results.append(
+            bench_events(
+                'log_ring_sink', scenarios['log'], transport, args.repeat,
+                log_sink=RingLogSink(1000),
+            )
+        )
+    for options in (10, 1000):
+        results.append(bench_split_valid_options(options, args.repeat))
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'time': time.time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(report, stream, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
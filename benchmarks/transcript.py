@@ -0,0 +1,133 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Generator of synthetic otopi machine dialog transcripts.
+
+Usage: python -m benchmarks.transcript [--events N] ... > transcript.txt
+"""
+
+
+import sys
+import random
+import argparse
+
+
+SEVERITIES = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+
+def generate(
+    events=10000,
+    log_ratio=0.6,
+    note_ratio=0.2,
+    frame_ratio=0.1,
+    multi_string_ratio=0.05,
+    multi_string_lines=100,
+    long_line_ratio=0.01,
+    long_line_length=65536,
+    valid_values=10,
+    seed=0,
+):
+    """
+    Returns transcript of machine dialog terminated by TERMINATE.
+
+    Keyword arguments:
+    events -- number of events
+    log_ratio -- ratio of LOG events
+    note_ratio -- ratio of NOTE events
+    frame_ratio -- ratio of framed queries
+    multi_string_ratio -- ratio of DISPLAY_MULTI_STRING events
+    multi_string_lines -- number of lines of each multi-string value
+    long_line_ratio -- ratio of LOG events with long record
+    long_line_length -- length of long record
+    valid_values -- number of valid values of framed queries
+    seed -- seed of random generator
+    """
+    rnd = random.Random(seed)
+    options = '|'.join(
+        'option\\|%d' % i for i in range(valid_values)
+    )
+    lines = []
+    for i in range(events):
+        x = rnd.random()
+        if x < log_ratio:
+            if rnd.random() < long_line_ratio:
+                record = 'x' * long_line_length
+            else:
+                record = 'record %d of synthetic transcript %s' % (
+                    i, 'y' * rnd.randint(0, 120),
+                )
+            lines.append(
+                '***L:%s %s' % (rnd.choice(SEVERITIES), record)
+            )
+            continue
+        x -= log_ratio
+        if x < note_ratio:
+            lines.append('### Note %d of synthetic transcript' % i)
+            continue
+        x -= note_ratio
+        if x < frame_ratio:
+            frame = 'FRAME_%d' % i
+            lines.append('**%%QStart: %s' % frame)
+            lines.append('**%QHidden: FALSE')
+            lines.append(
+                rnd.choice((
+                    '***Q:VALUE QUERY/value%d' % i,
+                    '***Q:STRING QUERY/string%d' % i,
+                    '***CONFIRM CONFIRM_%d Proceed?' % i,
+                ))
+            )
+            lines.append('**%%QDefault: option\\|%d' % i)
+            lines.append('**%%QValidValues: %s' % options)
+            lines.append('**%%QEnd: %s' % frame)
+            continue
+        x -= frame_ratio
+        if x < multi_string_ratio:
+            boundary = '--=boundary%d=--' % i
+            lines.append('***D:MULTI-STRING KEY/value%d %s' % (i, boundary))
+            lines.extend(
+                'multi-string line %d' % j
+                for j in range(multi_string_lines)
+            )
+            lines.append(boundary)
+            continue
+        lines.append('***D:VALUE KEY/value%d=int:%d' % (i, i))
+    lines.append('***TERMINATE')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--log-ratio', type=float, default=0.6)
+    parser.add_argument('--note-ratio', type=float, default=0.2)
+    parser.add_argument('--frame-ratio', type=float, default=0.1)
+    parser.add_argument('--multi-string-ratio', type=float, default=0.05)
+    parser.add_argument('--multi-string-lines', type=int, default=100)
+    parser.add_argument('--long-line-ratio', type=float, default=0.01)
+    parser.add_argument('--long-line-length', type=int, default=65536)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.stdout.write(generate(**vars(args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,11 @@
-from otopimdp.parser import MachineDialogParser
+import sys
+import importlib
+from otopimdp.parser import MachineDialogParser, AnswerTable
+from otopimdp.protocol import DialogProtocol
+from otopimdp.recorder import Recorder, Replay
+from otopimdp.transcript import TranscriptReader
+from otopimdp.metrics import Metrics
+from otopimdp.logsink import RingLogSink, FileLogSink
 from otopimdp.errors import (
     ParseError,
     UnexpectedEOF,
@@ -6,7 +13,23 @@ from otopimdp.errors import (
     HeadDoesNotMatch,
     DialogError,
     UnexpectedEventError,
+    InvalidReplyError,
     IncompleteQueryFrameError,
+    ReplayMismatchError,
+    DialogTimeoutError,
+    AnswerFileError,
+)
+from otopimdp.events import (
+    Event,
+    NoteEvent,
+    LogEvent,
+    TerminateEvent,
+    QueryStringEvent,
+    QueryMultiStringEvent,
+    QueryValueEvent,
+    ConfirmEvent,
+    DisplayValueEvent,
+    DisplayMultiStringEvent,
 )
 from otopimdp.constants import (
     ABORT_KEY,
@@ -17,6 +40,7 @@ from otopimdp.constants import (
     DEFAULT_KEY,
     HIDDEN_KEY,
     VALID_VALUES_KEY,
+    VALID_VALUES_SET_KEY,
     FRAME_NAME_KEY,
 )
 from otopimdp.constants import (
@@ -31,16 +55,65 @@ from otopimdp.constants import (
     TERMINATE_EVENT,
 )
 
+# asyncio, selectors, multiprocessing and answer file loader are imported
+# when the names are used first time
+_LAZY = {
+    'load_answer_file': 'otopimdp.answerfile',
+    'AsyncMachineDialogParser': 'otopimdp.aio',
+    'SessionMultiplexer': 'otopimdp.multiplexer',
+    'FleetRunner': 'otopimdp.fleet',
+    'Job': 'otopimdp.fleet',
+    'JobResult': 'otopimdp.fleet',
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _LAZY:
+            raise AttributeError(
+                "module %r has no attribute %r" % (__name__, name)
+            )
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+        globals()[name] = value
+        return value
+else:
+    from otopimdp.answerfile import load_answer_file  # noqa: F401
+    from otopimdp.fleet import FleetRunner, Job, JobResult  # noqa: F401
+    if sys.version_info >= (3, 5):
+        from otopimdp.aio import AsyncMachineDialogParser  # noqa: F401
+        from otopimdp.multiplexer import SessionMultiplexer  # noqa: F401
+
 
 __all__ = [
     'MachineDialogParser',
+    'AnswerTable',
+    'DialogProtocol',
+    'Recorder',
+    'Replay',
+    'TranscriptReader',
+    'Metrics',
+    'RingLogSink',
+    'FileLogSink',
     'ParseError',
     'UnexpectedEOF',
     'UnexpectedInputError',
     'HeadDoesNotMatch',
     'DialogError',
     'UnexpectedEventError',
+    'InvalidReplyError',
     'IncompleteQueryFrameError',
+    'ReplayMismatchError',
+    'DialogTimeoutError',
+    'AnswerFileError',
+    'Event',
+    'NoteEvent',
+    'LogEvent',
+    'TerminateEvent',
+    'QueryStringEvent',
+    'QueryMultiStringEvent',
+    'QueryValueEvent',
+    'ConfirmEvent',
+    'DisplayValueEvent',
+    'DisplayMultiStringEvent',
     'ABORT_KEY',
     'ATTRIBUTES_KEY',
     'REGEX_KEY',
@@ -49,6 +122,7 @@ __all__ = [
     'HIDDEN_KEY',
     'DEFAULT_KEY',
     'VALID_VALUES_KEY',
+    'VALID_VALUES_SET_KEY',
     'FRAME_NAME_KEY',
     'CONFIRM_EVENT',
     'DISPLAY_MULTI_STRING_EVENT',
@@ -60,3 +134,8 @@ __all__ = [
     'QUERY_VALUE_EVENT',
     'TERMINATE_EVENT',
 ]
+
+__all__.extend(sorted(
+    name for name in _LAZY
+    if sys.version_info >= (3, 7) or name in globals()
+))
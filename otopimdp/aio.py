@@ -0,0 +1,203 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements machine dialog parser for asyncio streams.
+It requires python 3.5 or newer.
+"""
+
+
+from otopimdp import base
+from otopimdp import errors
+from otopimdp import constants as c
+from otopimdp import protocol
+from otopimdp.protocol import _DialogGrammar
+
+
+@base.export
+class AsyncMachineDialogParser(_DialogGrammar):
+    """
+    Machine dialog parser working on asyncio.StreamReader and
+    asyncio.StreamWriter, e.g. stdout and stdin of process spawned by
+    asyncio.create_subprocess_exec.
+    """
+
+    def __init__(self, reader=None, writer=None, encoding='utf-8',
+                 errors='strict', read_size=65536):
+        """
+        Keyword arguments:
+        reader -- asyncio.StreamReader
+        writer -- asyncio.StreamWriter
+        encoding -- encoding of the dialog, only extracted values are
+            decoded
+        errors -- error policy of decoding, see codecs
+        read_size -- maximal size of data read from reader at once
+        """
+        super(AsyncMachineDialogParser, self).__init__()
+        self.reader = reader
+        self.writer = writer
+        self.encoding = encoding
+        self.errors = errors
+        self.read_size = read_size
+        self.protocol = protocol.DialogProtocol(encoding, errors)
+
+    async def _write(self, data):
+        """
+        Writes data to output stream
+
+        Keyword arguments:
+        data -- string to be written
+        """
+        self.logger.debug("writing data {{{\n%s\n}}}", data)
+        self.writer.write((data + '\n').encode(self.encoding))
+        await self.writer.drain()
+
+    async def _receive(self):
+        """
+        Passes available data of reader to protocol
+        """
+        data = await self.reader.read(self.read_size)
+        if data:
+            self.protocol.receive_data(data)
+        else:
+            self.protocol.receive_eof()
+
+    async def next_line(self):
+        """
+        Returns next line from input
+        """
+        while True:
+            line = self.protocol.next_line()
+            if line is not protocol.NEED_DATA:
+                return line.decode(self.encoding, self.errors)
+            await self._receive()
+
+    async def next_event(self):
+        """
+        Returns instance of Event
+        """
+        return await self._next_event()
+
+    async def _next_event(self, dest=None):
+        """
+        :param dest: file like object, lines of multi-string value are
+            written into it instead of the event
+        """
+        stream = dest is not None
+        while True:
+            event = self.protocol.next_event(stream)
+            if event is not protocol.NEED_DATA:
+                break
+            await self._receive()
+        if event is None:
+            return None
+        if stream and event.type == c.DISPLAY_MULTI_STRING_EVENT:
+            event.attributes['value'] = []
+            while True:
+                line = self.protocol.next_value_line()
+                if line is None:
+                    break
+                if line is protocol.NEED_DATA:
+                    await self._receive()
+                else:
+                    dest.write(line + '\n')
+        self.logger.debug("Next event: %s", event)
+        return event
+
+    async def send_response(self, event):
+        """
+        Sends response for replyable events.
+
+        :param event: instance of replyable event
+        """
+        self.logger.debug("Response for: %s", event)
+        await self._write(self._send_response(event))
+
+    async def cli_env_get(self, key):
+        """
+        Get value of environment variable
+
+        :param key: name of variable
+        :type key: str
+        :return: returns value for environment variable
+        :rtype: str
+        """
+        await self._write('env-get -k %s' % key)
+
+        event = await self.next_event()
+        if event[c.TYPE_KEY] not in self.DISPLAY_EVENTS:
+            raise errors.UnexpectedEventError(event)
+        return event[c.ATTRIBUTES_KEY]['value']
+
+    async def cli_env_set(self, key, value):
+        """
+        Sets given value for given environment variable
+
+        :param key: name of variable
+        :type key: str
+        :param value: value to be set
+        :type value: str
+        """
+        await self._write(self._env_query_command(key, value))
+
+        event = await self.next_event()
+        if event[c.TYPE_KEY] not in self.QUERY_EVENTS:
+            raise errors.UnexpectedEventError(event)
+        event[c.REPLY_KEY] = value
+        await self.send_response(event)
+
+    async def cli_download_log(self, dest=None):
+        """
+        Returns log
+
+        :param dest: file like object, when given the log is written into
+            it line by line and nothing is returned
+        """
+        await self._write('log')
+        event = await self._next_event(dest)
+        if event[c.TYPE_KEY] == c.DISPLAY_MULTI_STRING_EVENT:
+            if dest is None:
+                return '\n'.join(event[c.ATTRIBUTES_KEY]['value']) + '\n'
+            return None
+        raise errors.UnexpectedEventError(event)
+
+    async def cli_noop(self):
+        """
+        noop command
+        """
+        await self._write('noop')
+
+    async def cli_quit(self):
+        """
+        quit command
+        """
+        await self._write('quit')
+
+    async def cli_install(self):
+        """
+        install command
+        """
+        await self._write('install')
+
+    async def cli_abort(self):
+        """
+        abort command
+        """
+        await self._write('abort')
@@ -0,0 +1,203 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements loader of otopi answer files, their values are compiled
+into AnswerTable.
+"""
+
+
+import io
+import os
+import json
+import hashlib
+import tempfile
+import six
+from otopimdp import base
+from otopimdp import errors
+from otopimdp import events
+from otopimdp import constants as c
+from otopimdp.parser import AnswerTable
+from otopimdp.protocol import _DialogGrammar
+
+
+DEFAULT_SECTION = 'environment:default'
+
+# bumped whenever content of cached tables changes
+CACHE_VERSION = 3
+
+# types of answer file values (bool is int), see events.VALUE_TYPES
+_CACHED_VALUE_TYPES = six.string_types + six.integer_types + (type(None),)
+
+
+@base.export
+def parse_answer_file(lines, sections=(DEFAULT_SECTION,), name='<string>'):
+    """
+    Parses KEY=type:value lines of given sections.
+
+    :param lines: iterable of lines of answer file
+    :param sections: names of sections which are read, later section
+        overrides values of former one
+    :param name: name of the file used in errors
+    :return: dict {key: value}, value is converted by its type
+    """
+    order = dict((section, i) for i, section in enumerate(sections))
+    found = [{} for _ in sections]
+    values = None
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line[0] in '#;':
+            continue
+        if line[0] == '[':
+            if line[-1] != ']':
+                raise errors.AnswerFileError(
+                    "%s:%d: invalid section: %s" % (name, number, line)
+                )
+            index = order.get(line[1:-1].strip())
+            values = None if index is None else found[index]
+            continue
+        if values is None:
+            continue
+        key, sep, typed = line.partition('=')
+        value_type, sep2, value = typed.partition(':')
+        converter = events.VALUE_TYPES.get(value_type.strip().lower())
+        try:
+            if not sep or not sep2 or converter is None:
+                raise ValueError("expected KEY=type:value")
+            values[key.strip()] = converter(value)
+        except ValueError as ex:
+            raise errors.AnswerFileError(
+                "%s:%d: %s: %s" % (name, number, ex, line)
+            )
+    result = {}
+    for values in found:
+        result.update(values)
+    return result
+
+
+@base.export
+def compile_answers(values):
+    """
+    Compiles values into replies of queries named by their keys.
+
+    Every value answers QUERY_VALUE, strings and integers answer also
+    QUERY_STRING and booleans CONFIRM.
+
+    :param values: dict {key: value} as returned by parse_answer_file
+    :return: instance of AnswerTable
+    """
+    table = AnswerTable()
+    for key, value in values.items():
+        table.add(c.QUERY_VALUE_EVENT, key, value)
+        if isinstance(value, bool):
+            table.add(c.CONFIRM_EVENT, key, value)
+        elif value is not None:
+            table.add(c.QUERY_STRING_EVENT, key, str(value))
+    return table
+
+
+def _fingerprint(path, sections):
+    """
+    Fingerprint of file identified by its path, size and modification
+    time, so loading from cache doesn't read the file.
+    """
+    stat = os.stat(path)
+    mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+    key = repr((
+        CACHE_VERSION, os.path.abspath(path), stat.st_size, mtime,
+        tuple(sections),
+    ))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _read_cache(cache_path):
+    """
+    Returns cached table, None when it's missing or invalid. Cache is JSON
+    list of [event type, name, reply, value] lists, value is the reply
+    before encoding.
+    """
+    table = AnswerTable()
+    try:
+        with open(cache_path, 'rb') as f:
+            entries = json.loads(f.read().decode('utf-8'))
+        if not isinstance(entries, list):
+            return None
+        for entry in entries:
+            if not (
+                isinstance(entry, list) and
+                len(entry) == 4 and
+                all(
+                    isinstance(item, six.string_types)
+                    for item in entry[:3]
+                ) and
+                isinstance(entry[3], _CACHED_VALUE_TYPES) and
+                entry[0] in _DialogGrammar.REPLY_NAME_KEYS
+            ):
+                return None
+            event_type, name, reply, value = entry
+            key = (str(event_type), name)
+            # replies are encoded already
+            table[key] = reply
+            table.values[key] = value
+    except Exception:
+        return None
+    return table
+
+
+def _write_cache(cache_dir, cache_path, table):
+    entries = sorted(
+        [event_type, name, reply, table.values[(event_type, name)]]
+        for (event_type, name), reply in table.items()
+    )
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(entries).encode('utf-8'))
+        os.rename(tmp_path, cache_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+@base.export
+def load_answer_file(path, sections=(DEFAULT_SECTION,), cache_dir=None):
+    """
+    Loads answer file into AnswerTable.
+
+    :param path: path of the answer file
+    :param sections: names of sections which are read, see
+        parse_answer_file
+    :param cache_dir: directory where compiled tables are cached, they are
+        keyed by fingerprint of the file, so changed file is parsed again
+    :return: instance of AnswerTable
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(
+            cache_dir, _fingerprint(path, sections) + '.answers',
+        )
+        table = _read_cache(cache_path)
+        if table is not None:
+            return table
+    with io.open(path, encoding='utf-8') as f:
+        table = compile_answers(parse_answer_file(f, sections, path))
+    if cache_path is not None:
+        _write_cache(cache_dir, cache_path, table)
+    return table
@@ -0,0 +1,60 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements base class and export decorator compatible with
+otopi.base and otopi.util, so otopi doesn't have to be installed.
+"""
+
+
+import sys
+import logging
+
+
+LOG_PREFIX = 'otopi.'
+
+
+def export(o):
+    """
+    Decorator adding name of object to __all__ of its module
+    """
+    sys.modules[o.__module__].__dict__.setdefault(
+        '__all__', []
+    ).append(o.__name__)
+    return o
+
+
+@export
+class Base(object):
+    """
+    Base class providing logger.
+
+    Loggers are named as in otopi (LOG_PREFIX + name of module), so
+    records are handled by logging configured by otopi when it runs
+    in the same process. The logger is created on first use.
+    """
+
+    _logger = None
+
+    @property
+    def logger(self):
+        if self._logger is None:
+            self._logger = logging.getLogger(LOG_PREFIX + self.__module__)
+        return self._logger
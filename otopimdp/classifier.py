@@ -0,0 +1,103 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements classifier of machine dialog lines.
+"""
+
+
+from otopimdp import constants as c
+
+
+class EventClassifier(object):
+    """
+    Picks the only pattern of translation table which can match given line
+    according to its prefix, so every line costs at most one regex match.
+    """
+
+    def __init__(self, translation=c.TRANSLATION, binary=False):
+        """
+        Keyword arguments:
+        translation -- sequence of event types, see constants.TRANSLATION
+        binary -- classify bytes lines, patterns are encoded
+        """
+        if binary:
+            # prefixes and patterns are ASCII
+            translation = [
+                {
+                    c.TYPE_KEY: entry[c.TYPE_KEY],
+                    c.PREFIX_KEY: entry[c.PREFIX_KEY].encode('ascii'),
+                    c.REGEX_KEY: c._LazyRegex(
+                        entry[c.REGEX_KEY].pattern.encode('ascii')
+                    ),
+                }
+                for entry in translation
+            ]
+        prefixes = [entry[c.PREFIX_KEY] for entry in translation]
+        for prefix in prefixes:
+            for other in prefixes:
+                if prefix != other and other.startswith(prefix):
+                    raise ValueError(
+                        "Prefix '%s' is ambiguous with '%s'" % (prefix, other)
+                    )
+        # first character -> [(prefix length, {prefix: entry}), ...]
+        tables = {}
+        for entry in translation:
+            prefix = entry[c.PREFIX_KEY]
+            candidates = tables.setdefault(prefix[:1], {})
+            candidates.setdefault(len(prefix), {})[prefix] = entry
+        self._tables = dict(
+            (char, sorted(candidates.items()))
+            for char, candidates in tables.items()
+        )
+
+    def classify(self, line):
+        """
+        Returns tuple (event type, match object) or None when line doesn't
+        match any event.
+        """
+        candidates = self._tables.get(line[:1])
+        if candidates is None:
+            return None
+        for length, table in candidates:
+            entry = table.get(line[:length])
+            if entry is not None:
+                match = entry[c.REGEX_KEY].match(line)
+                if match is None:
+                    return None
+                return entry[c.TYPE_KEY], match
+        return None
+
+    def event_type(self, line):
+        """
+        Returns type of event which line starts like or None, the line
+        isn't matched, so it may not be valid event of the type.
+        """
+        candidates = self._tables.get(line[:1])
+        if candidates is None:
+            return None
+        for length, table in candidates:
+            entry = table.get(line[:length])
+            if entry is not None:
+                return entry[c.TYPE_KEY]
+        return None
+
+
+DEFAULT_CLASSIFIER = EventClassifier()
@@ -39,14 +39,47 @@ DISPLAY_MULTI_STRING_EVENT = 'display_multi_string'
 
 TYPE_KEY = 'type'
 REGEX_KEY = 'regex'
+PREFIX_KEY = 'prefix'
 ATTRIBUTES_KEY = 'attributes'
 REPLY_KEY = 'reply'
 ABORT_KEY = 'abort'
 DEFAULT_KEY = 'default'
 HIDDEN_KEY = 'hidden'
 VALID_VALUES_KEY = 'valid_values'
+# frozenset of valid values used to check replies
+VALID_VALUES_SET_KEY = 'valid_values_set'
 FRAME_NAME_KEY = 'frame_name'
 
+# When written messages are flushed to output, see
+# MachineDialogParser.flush_policy
+FLUSH_MESSAGE = 'message'
+FLUSH_BATCH = 'batch'
+FLUSH_EXPLICIT = 'explicit'
+
+
+class _LazyRegex(object):
+    """
+    Regular expression compiled on first use, it provides the same
+    attributes as compiled one, so importing of this module doesn't
+    pay for compilation of all patterns.
+    """
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+
+    def __getattr__(self, name):
+        # called only for attributes which weren't cached yet
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, value)
+        return value
+
+    def __repr__(self):
+        return '_LazyRegex(%r)' % self.pattern
+
+
 QUERY_FRAME_PART_START = 'qfstart'
 QUERY_FRAME_PART_END = 'qfend'
 QUERY_FRAME_PART_DEFAULT = 'qfdefault'
@@ -54,44 +87,52 @@ QUERY_FRAME_PART_HIDDEN = 'qfhidden'
 QUERY_FRAME_PART_VALID_VALUES = 'qfvalidvalues'
 
 QUERY_FRAME_PATTERNS = {
-    QUERY_FRAME_PART_START: re.compile(r'^[*]{2}%QStart: (?P<frame_name>.*)$'),
-    QUERY_FRAME_PART_END: re.compile(r'^[*]{2}%QEnd: (?P<frame_name>.*)$'),
-    QUERY_FRAME_PART_DEFAULT: re.compile(
+    QUERY_FRAME_PART_START: _LazyRegex(r'^[*]{2}%QStart: (?P<frame_name>.*)$'),
+    QUERY_FRAME_PART_END: _LazyRegex(r'^[*]{2}%QEnd: (?P<frame_name>.*)$'),
+    QUERY_FRAME_PART_DEFAULT: _LazyRegex(
         r'^[*]{2}%QDefault: (?P<default>.*)$'
     ),
-    QUERY_FRAME_PART_HIDDEN: re.compile(r'^[*]{2}%QHidden: (?P<hidden>.*)$'),
-    QUERY_FRAME_PART_VALID_VALUES: re.compile(
+    QUERY_FRAME_PART_HIDDEN: _LazyRegex(r'^[*]{2}%QHidden: (?P<hidden>.*)$'),
+    QUERY_FRAME_PART_VALID_VALUES: _LazyRegex(
         r'^[*]{2}%QValidValues: (?P<valid>.*)$'
     ),
 }
 
 
+# Every event line starts with fixed PREFIX_KEY which is used to pick
+# the only REGEX_KEY which can match it, see otopimdp.classifier.
 TRANSLATION = (
     {
         TYPE_KEY: NOTE_EVENT,
-        REGEX_KEY: re.compile(r'^#+ *(?P<note>.*)$'),
+        PREFIX_KEY: '#',
+        REGEX_KEY: _LazyRegex(r'^#+ *(?P<note>.*)$'),
     },
     {
         TYPE_KEY: LOG_EVENT,
-        REGEX_KEY: re.compile(
+        PREFIX_KEY: '***L:',
+        REGEX_KEY: _LazyRegex(
             r'^[*]{3}L:(?P<severity>[^ ]+) (?P<record>.*)$'
         ),
     },
     {
         TYPE_KEY: TERMINATE_EVENT,
-        REGEX_KEY: re.compile(r'^[*]{3}TERMINATE$'),
+        PREFIX_KEY: '***TERMINATE',
+        REGEX_KEY: _LazyRegex(r'^[*]{3}TERMINATE$'),
     },
     {
         TYPE_KEY: QUERY_FRAME_EVENT,
+        PREFIX_KEY: '**%QStart: ',
         REGEX_KEY: QUERY_FRAME_PATTERNS[QUERY_FRAME_PART_START],
     },
     {
         TYPE_KEY: QUERY_STRING_EVENT,
-        REGEX_KEY: re.compile(r'^[*]{3}Q:STRING (?P<name>.*)$'),
+        PREFIX_KEY: '***Q:STRING ',
+        REGEX_KEY: _LazyRegex(r'^[*]{3}Q:STRING (?P<name>.*)$'),
     },
     {
         TYPE_KEY: QUERY_MULTI_STRING_EVENT,
-        REGEX_KEY: re.compile(
+        PREFIX_KEY: '***Q:MULTI-STRING ',
+        REGEX_KEY: _LazyRegex(
             r'^[*]{3}Q:MULTI-STRING '
             r'(?P<name>[^ ]+) '
             r'(?P<boundary>[^ ]+) '
@@ -100,17 +141,20 @@ TRANSLATION = (
     },
     {
         TYPE_KEY: QUERY_VALUE_EVENT,
-        REGEX_KEY: re.compile(r'^[*]{3}Q:VALUE (?P<name>.*)$'),
+        PREFIX_KEY: '***Q:VALUE ',
+        REGEX_KEY: _LazyRegex(r'^[*]{3}Q:VALUE (?P<name>.*)$'),
     },
     {
         TYPE_KEY: CONFIRM_EVENT,
-        REGEX_KEY: re.compile(
+        PREFIX_KEY: '***CONFIRM ',
+        REGEX_KEY: _LazyRegex(
             r'^[*]{3}CONFIRM (?P<what>[^ ]+) (?P<description>.*)$'
         ),
     },
     {
         TYPE_KEY: DISPLAY_VALUE_EVENT,
-        REGEX_KEY: re.compile(
+        PREFIX_KEY: '***D:VALUE ',
+        REGEX_KEY: _LazyRegex(
             r'^[*]{3}D:VALUE '
             r'(?P<name>[^=]+)='
             r'(?P<type>[^:]+):'
@@ -119,7 +163,8 @@ TRANSLATION = (
     },
     {
         TYPE_KEY: DISPLAY_MULTI_STRING_EVENT,
-        REGEX_KEY: re.compile(
+        PREFIX_KEY: '***D:MULTI-STRING ',
+        REGEX_KEY: _LazyRegex(
             r'^[*]{3}D:MULTI-STRING (?P<name>[^ ]+) (?P<boundary>.*)$'
         ),
     },
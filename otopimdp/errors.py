@@ -46,5 +46,21 @@ class UnexpectedEventError(DialogError):
     pass
 
 
+class InvalidReplyError(DialogError):
+    pass
+
+
 class IncompleteQueryFrameError(ParseError):
     pass
+
+
+class ReplayMismatchError(DialogError):
+    pass
+
+
+class DialogTimeoutError(ParseError):
+    pass
+
+
+class AnswerFileError(ParseError):
+    pass
@@ -0,0 +1,241 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module contains classes of events produced by parser.
+"""
+
+
+from otopimdp import constants as c
+
+
+# type of DISPLAY_VALUE -> conversion of its value
+VALUE_TYPES = {
+    'none': lambda value: None,
+    'str': str,
+    'int': int,
+    'bool': lambda value: value.lower() == "true",
+}
+
+# event key -> attribute of Event
+_KEYS = {
+    c.TYPE_KEY: 'type',
+    c.ATTRIBUTES_KEY: 'attributes',
+    c.REPLY_KEY: 'reply',
+    c.ABORT_KEY: 'abort',
+}
+
+
+def _groupdict(match, decode):
+    attributes = match.groupdict()
+    if decode is not None:
+        for name, value in attributes.items():
+            if value is not None:
+                attributes[name] = value.decode(*decode)
+    return attributes
+
+
+class Event(object):
+    """
+    Base class of events.
+
+    Events can be accessed as dictionaries by TYPE_KEY, ATTRIBUTES_KEY,
+    REPLY_KEY and ABORT_KEY, reply and abort are not present until they
+    are set.
+
+    Event created from match object extracts its attributes when they
+    are accessed for the first time, values of bytes match are decoded
+    then.
+    """
+
+    __slots__ = ('_attributes', '_match', '_decode', 'reply', 'abort')
+    type = None
+
+    def __init__(self, attributes=None, match=None, decode=None):
+        """
+        Keyword arguments:
+        attributes -- dict of attributes
+        match -- match object of event line
+        decode -- tuple (encoding, errors) when match is of bytes line
+        """
+        self._attributes = attributes
+        self._match = match
+        self._decode = decode
+
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = self._extract(
+                _groupdict(self._match, self._decode)
+            )
+            self._match = None
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, attributes):
+        self._attributes = attributes
+        self._match = None
+
+    @staticmethod
+    def _extract(attributes):
+        return attributes
+
+    def __getstate__(self):
+        state = {'attributes': self.attributes}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if not name.startswith('_') and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        self._match = None
+        self._decode = None
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, _KEYS[key])
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == c.TYPE_KEY:
+            raise KeyError("%s of event can not be changed" % key)
+        setattr(self, _KEYS[key], value)
+
+    def __contains__(self, key):
+        return key in _KEYS and hasattr(self, _KEYS[key])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return "%s(%s)" % (
+            self.__class__.__name__,
+            dict(
+                (key, self[key]) for key in (
+                    c.TYPE_KEY, c.ATTRIBUTES_KEY, c.REPLY_KEY, c.ABORT_KEY,
+                ) if key in self
+            ),
+        )
+
+
+class NoteEvent(Event):
+    __slots__ = ()
+    type = c.NOTE_EVENT
+
+
+class LogEvent(Event):
+    __slots__ = ()
+    type = c.LOG_EVENT
+
+
+class TerminateEvent(Event):
+    __slots__ = ()
+    type = c.TERMINATE_EVENT
+
+
+class QueryFrameEvent(Event):
+    """
+    Frame of query, the framed query is stored in query when it is parsed.
+    """
+    __slots__ = ('query',)
+    type = c.QUERY_FRAME_EVENT
+
+    def __init__(self, attributes=None, match=None, decode=None):
+        super(QueryFrameEvent, self).__init__(attributes, match, decode)
+        self.query = None
+
+
+class QueryStringEvent(Event):
+    __slots__ = ()
+    type = c.QUERY_STRING_EVENT
+
+
+class QueryMultiStringEvent(Event):
+    __slots__ = ()
+    type = c.QUERY_MULTI_STRING_EVENT
+
+
+class QueryValueEvent(Event):
+    __slots__ = ()
+    type = c.QUERY_VALUE_EVENT
+
+
+class ConfirmEvent(Event):
+    __slots__ = ()
+    type = c.CONFIRM_EVENT
+
+
+class DisplayValueEvent(Event):
+    """
+    Displayed value, its type is checked when the event is created, but
+    the value is converted on first access.
+    """
+    __slots__ = ()
+    type = c.DISPLAY_VALUE_EVENT
+
+    def __init__(self, attributes=None, match=None, decode=None):
+        super(DisplayValueEvent, self).__init__(attributes, match, decode)
+        if match is None:
+            return
+        value_type = match.group('type').lower()
+        if decode is not None:
+            value_type = value_type.decode(*decode)
+        if value_type not in VALUE_TYPES:
+            raise TypeError(
+                "Unexpected type of %s.value: '%s'" % (
+                    c.DISPLAY_VALUE_EVENT,
+                    match.group('value'),
+                )
+            )
+
+    @staticmethod
+    def _extract(attributes):
+        attributes['value'] = VALUE_TYPES[attributes['type'].lower()](
+            attributes['value']
+        )
+        return attributes
+
+
+class DisplayMultiStringEvent(Event):
+    __slots__ = ()
+    type = c.DISPLAY_MULTI_STRING_EVENT
+
+
+EVENT_CLASSES = dict(
+    (event_class.type, event_class) for event_class in (
+        NoteEvent,
+        LogEvent,
+        TerminateEvent,
+        QueryFrameEvent,
+        QueryStringEvent,
+        QueryMultiStringEvent,
+        QueryValueEvent,
+        ConfirmEvent,
+        DisplayValueEvent,
+        DisplayMultiStringEvent,
+    )
+)
@@ -0,0 +1,290 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements runner of many installers, every one is driven by
+its own MachineDialogParser in a process of pool.
+"""
+
+
+import os
+import heapq
+import itertools
+import subprocess
+import traceback
+import multiprocessing
+import six
+from six.moves import cPickle as pickle
+from six.moves import queue
+from otopimdp import base
+from otopimdp import constants as c
+from otopimdp import parser as p
+
+
+# severities of LOG events collected as failing events
+FAILING_SEVERITIES = frozenset(('ERROR', 'CRITICAL', 'FATAL'))
+
+
+@base.export
+class Job(object):
+    """
+    Deployment of single host.
+    """
+
+    def __init__(self, host, command, env=None, answers=(), priority=0,
+                 download_log=True, timeout=None):
+        """
+        Keyword arguments:
+        host -- name of the job, results are keyed by it
+        command -- list of arguments of installer, it has to talk
+            machine dialog on its stdin/stdout
+        env -- dict of variables added to environment of installer
+        answers -- instance of AnswerTable or dict accepted by it
+        priority -- jobs with lower priority are started first
+        download_log -- log is downloaded by cli_download_log after
+            TERMINATE event
+        timeout -- session timeout of the parser in seconds
+        """
+        self.host = host
+        self.command = command
+        self.env = env
+        self.answers = answers
+        self.priority = priority
+        self.download_log = download_log
+        self.timeout = timeout
+
+
+@base.export
+class JobResult(object):
+    """
+    Result of Job, it is passed between processes so all its attributes
+    are picklable.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        # exit status of installer, None when it wasn't started
+        self.returncode = None
+        # wall clock duration in seconds
+        self.duration = None
+        self.log = None
+        # unanswered queries and LOG events of FAILING_SEVERITIES
+        self.failed_events = []
+        # formatted traceback of exception raised while driving the dialog,
+        # or reason why the installer was killed
+        self.error = None
+
+    @property
+    def ok(self):
+        return (
+            self.returncode == 0 and
+            self.error is None and
+            not self.failed_events
+        )
+
+    def __repr__(self):
+        return '<JobResult %s returncode=%s failed_events=%d error=%s>' % (
+            self.host,
+            self.returncode,
+            len(self.failed_events),
+            self.error is not None,
+        )
+
+
+class _UnansweredQuery(Exception):
+    """
+    Raised for query without answer which can't be aborted.
+    """
+
+
+def _abort(parser, event):
+    if event.type == c.QUERY_STRING_EVENT:
+        # machine dialog has no abort of string query, any reply would be
+        # taken as the value
+        raise _UnansweredQuery(
+            "%s %s can't be aborted, installer was killed" % (
+                event.type, event.attributes['name'],
+            )
+        )
+    event[c.ABORT_KEY] = True
+    parser.send_response(event)
+
+
+def run_job(job):
+    """
+    Runs single job in current process.
+
+    :param job: instance of Job
+    :return: instance of JobResult, exceptions are stored in its error
+    """
+    result = JobResult(job.host)
+    start = p._monotonic()
+    env = None
+    if job.env:
+        env = dict(os.environ)
+        env.update(job.env)
+    try:
+        process = subprocess.Popen(
+            job.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+    except OSError:
+        result.error = traceback.format_exc()
+        result.duration = p._monotonic() - start
+        return result
+
+    def fallback(parser, event):
+        result.failed_events.append(event)
+        _abort(parser, event)
+
+    def observer(parser, event):
+        if (
+            event.type == c.LOG_EVENT and
+            event.attributes['severity'] in FAILING_SEVERITIES
+        ):
+            result.failed_events.append(event)
+
+    try:
+        parser = p.MachineDialogParser(
+            process.stdout,
+            process.stdin,
+            encoding='utf-8',
+            session_timeout=job.timeout,
+        )
+        parser.run(job.answers, fallback, observer)
+        if job.download_log:
+            result.log = parser.cli_download_log()
+        parser.cli_quit()
+    except _UnansweredQuery as ex:
+        result.error = str(ex)
+        process.kill()
+    except Exception:
+        result.error = traceback.format_exc()
+        process.kill()
+    finally:
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+        result.returncode = process.wait()
+        process.stdout.close()
+        result.duration = p._monotonic() - start
+    return result
+
+
+@base.export
+class FleetRunner(base.Base):
+    """
+    Runs jobs in pool of processes.
+
+    At most concurrency jobs run at once, waiting jobs are kept in priority
+    queue, so the pool gets next job only when it has free process.
+    """
+
+    def __init__(self, concurrency=None, on_result=None):
+        """
+        Keyword arguments:
+        concurrency -- number of jobs running at once, number of CPUs
+            when None
+        on_result -- callable on_result(result) called in order in which
+            jobs finish
+        """
+        super(FleetRunner, self).__init__()
+        if concurrency is None:
+            concurrency = multiprocessing.cpu_count()
+        if concurrency < 1:
+            raise ValueError("concurrency has to be positive")
+        self.concurrency = concurrency
+        self.on_result = on_result
+        self._queue = []
+        # keeps order of jobs with same priority
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, job):
+        """
+        Adds job to queue.
+
+        :param job: instance of Job
+        """
+        heapq.heappush(self._queue, (job.priority, next(self._counter), job))
+
+    def _apply(self, pool, job, done):
+        """
+        Starts job in pool, its result is put into done, also when the job
+        fails in pool, e.g. it can't be pickled.
+        """
+        def failed(exc):
+            result = JobResult(job.host)
+            result.error = ''.join(traceback.format_exception(
+                type(exc), exc, getattr(exc, '__traceback__', None),
+            ))
+            done.put(result)
+
+        if six.PY3:
+            pool.apply_async(
+                run_job, (job,), callback=done.put, error_callback=failed,
+            )
+            return
+        # pool of python 2 has no error_callback
+        try:
+            pickle.dumps(job, pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            failed(exc)
+            return
+        pool.apply_async(run_job, (job,), callback=done.put)
+
+    def run(self, jobs=()):
+        """
+        Runs queued and given jobs.
+
+        :param jobs: iterable of Job instances added to queue
+        :return: dict {host: JobResult}
+        """
+        for job in jobs:
+            self.submit(job)
+        results = {}
+        if not self._queue:
+            return results
+        done = queue.Queue()
+        slots = min(self.concurrency, len(self._queue))
+        pool = multiprocessing.Pool(slots)
+        running = 0
+        try:
+            while self._queue or running:
+                while self._queue and running < slots:
+                    _, _, job = heapq.heappop(self._queue)
+                    self.logger.debug("Starting job %s", job.host)
+                    self._apply(pool, job, done)
+                    running += 1
+                result = done.get()
+                running -= 1
+                self.logger.debug("Finished %r", result)
+                results[result.host] = result
+                if self.on_result is not None:
+                    self.on_result(result)
+        finally:
+            pool.terminate()
+            pool.join()
+        return results
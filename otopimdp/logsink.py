@@ -0,0 +1,145 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements sinks of LOG records, see DialogProtocol.log_sink.
+
+Sink is called as sink(severity, record) for every LOG line instead of
+creating its event.
+"""
+
+
+import io
+import six
+from otopimdp import base
+
+
+@base.export
+class RingLogSink(object):
+    """
+    Keeps last size records in preallocated ring buffer.
+    """
+
+    def __init__(self, size):
+        """
+        Keyword arguments:
+        size -- maximal number of kept records
+        """
+        if size < 1:
+            raise ValueError("Size of ring must be positive: %s" % size)
+        self.size = size
+        self._records = [None] * size
+        self._next = 0
+        # number of records passed to sink
+        self.count = 0
+
+    def __call__(self, severity, record):
+        self._records[self._next] = (severity, record)
+        self._next += 1
+        if self._next == self.size:
+            self._next = 0
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def records(self):
+        """
+        Returns list of kept (severity, record) tuples from the oldest
+        """
+        if self.count < self.size:
+            return self._records[:self.count]
+        return self._records[self._next:] + self._records[:self._next]
+
+    def format(self):
+        """
+        Returns kept records as lines 'SEVERITY record'
+        """
+        return ''.join(
+            '%s %s\n' % (severity, record)
+            for severity, record in self.records()
+        )
+
+    def clear(self):
+        self._records = [None] * self.size
+        self._next = 0
+        self.count = 0
+
+
+@base.export
+class FileLogSink(object):
+    """
+    Writes records as lines 'SEVERITY record' to file, lines are joined
+    into single write by batches.
+    """
+
+    def __init__(self, file_, batch_size=256, encoding='utf-8'):
+        """
+        Keyword arguments:
+        file_ -- path of file which is appended or text file like object,
+            the file opened by path is closed by close()
+        batch_size -- number of records written at once
+        encoding -- encoding of file opened by path
+        """
+        self._owned = isinstance(file_, six.string_types)
+        if self._owned:
+            file_ = io.open(file_, 'a', encoding=encoding)
+        self.file_ = file_
+        self.batch_size = batch_size
+        self._batch = []
+        # number of records passed to sink
+        self.count = 0
+
+    def __call__(self, severity, record):
+        batch = self._batch
+        batch.append(severity)
+        batch.append(' ')
+        batch.append(record)
+        batch.append('\n')
+        self.count += 1
+        if len(batch) >= self.batch_size * 4:
+            self._write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self):
+        if self._batch:
+            self.file_.write(''.join(self._batch))
+            self._batch = []
+
+    def flush(self):
+        """
+        Writes pending records and flushes the file
+        """
+        self._write()
+        self.file_.flush()
+
+    def close(self):
+        """
+        Writes pending records, the file is closed when it was opened by
+        the sink
+        """
+        self.flush()
+        if self._owned:
+            self.file_.close()
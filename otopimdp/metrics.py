@@ -0,0 +1,146 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements instrumentation of machine dialog sessions.
+"""
+
+
+import time
+import bisect
+from otopimdp import base
+
+
+# counters
+BYTES_READ = 'bytes_read'
+LINES_READ = 'lines_read'
+UNMATCHED_LINES = 'unmatched_lines'
+# events of types which aren't subscribed, see DialogProtocol.subscribed
+SKIPPED_EVENTS = 'skipped_events'
+REPLIES_SENT = 'replies_sent'
+# prefix of counters of events per type
+EVENTS = 'events'
+
+# histograms, in seconds
+READ_WAIT = 'read_wait'
+PARSE_TIME = 'parse_time'
+REPLY_DELAY = 'reply_delay'
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class Histogram(object):
+    """
+    Histogram with exponential buckets from 1 microsecond to ~134 seconds.
+    """
+
+    BOUNDS = tuple(1e-6 * 2 ** i for i in range(28))
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = [0] * (len(self.BOUNDS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+
+    def snapshot(self):
+        """
+        Returns dict with count, sum, min, max and buckets, the buckets
+        are pairs [upper bound, count] of non-empty buckets, the last
+        bound is None.
+        """
+        bounds = self.BOUNDS + (None,)
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': [
+                [bounds[i], count]
+                for i, count in enumerate(self._buckets) if count
+            ],
+        }
+
+
+@base.export
+class Metrics(object):
+    """
+    Counters and timing histograms of single session.
+
+    Every measurement is passed to sink(name, value) when sink is given,
+    counters of events are named EVENTS + '.' + event type.
+    """
+
+    COUNTERS = (
+        BYTES_READ, LINES_READ, UNMATCHED_LINES, SKIPPED_EVENTS, REPLIES_SENT,
+    )
+    HISTOGRAMS = (READ_WAIT, PARSE_TIME, REPLY_DELAY)
+
+    def __init__(self, sink=None):
+        """
+        Keyword arguments:
+        sink -- callable sink(name, value)
+        """
+        self.sink = sink
+        self.reset()
+
+    def reset(self):
+        self.counters = dict((name, 0) for name in self.COUNTERS)
+        self.events = {}
+        self.histograms = dict(
+            (name, Histogram()) for name in self.HISTOGRAMS
+        )
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+        if self.sink is not None:
+            self.sink(name, value)
+
+    def count_event(self, event_type):
+        self.events[event_type] = self.events.get(event_type, 0) + 1
+        if self.sink is not None:
+            self.sink('%s.%s' % (EVENTS, event_type), 1)
+
+    def observe(self, name, value):
+        self.histograms[name].observe(value)
+        if self.sink is not None:
+            self.sink(name, value)
+
+    def snapshot(self):
+        """
+        Returns dict with counters, events and histograms
+        """
+        return {
+            'counters': dict(self.counters),
+            EVENTS: dict(self.events),
+            'histograms': dict(
+                (name, histogram.snapshot())
+                for name, histogram in self.histograms.items()
+            ),
+        }
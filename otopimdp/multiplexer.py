@@ -0,0 +1,246 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements driver of many machine dialog sessions in single thread.
+"""
+
+
+import os
+import codecs
+import errno
+import select
+import selectors
+from otopimdp import base
+
+
+class _WouldBlock(Exception):
+    """
+    Raised when parser needs more data than is available.
+    """
+
+
+class _SessionInput(object):
+    """
+    Input of multiplexed parser.
+
+    All available data is fed directly into protocol of parser, so reading
+    from this object means that the event isn't complete yet.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.eof = False
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def read(self, size=-1):
+        raise _WouldBlock()
+
+    def readline(self, size=-1):
+        raise _WouldBlock()
+
+
+class _Session(object):
+
+    def __init__(self, parser, handler, input_, encoding, on_error):
+        self.parser = parser
+        self.handler = handler
+        self.on_error = on_error
+        self.input_ = input_
+        self.fd = input_.fileno()
+        # restored by unregister
+        self.blocking = os.get_blocking(self.fd)
+        # parser in bytes mode is fed directly
+        self.decoder = None
+        if parser.encoding is None:
+            self.decoder = codecs.getincrementaldecoder(encoding)()
+
+
+@base.export
+class SessionMultiplexer(base.Base):
+    """
+    Drives many MachineDialogParser sessions from single thread.
+
+    Input of every session is read in non-blocking mode when it is ready
+    and completed events are passed to handler of the session. Handler is
+    called as handler(parser, event), it may reply to the event, but it
+    must not wait for another event (e.g. by calling cli_env_get).
+
+    Session which fails (its input can't be parsed, its handler raises,
+    ...) is unregistered and its error is reported, other sessions
+    continue.
+    """
+
+    def __init__(self, selector=None, read_size=65536):
+        """
+        Keyword arguments:
+        selector -- instance of selectors.BaseSelector
+        read_size -- maximal size of data read from session at once
+        """
+        super(SessionMultiplexer, self).__init__()
+        if selector is None:
+            selector = selectors.DefaultSelector()
+        self._selector = selector
+        self.read_size = read_size
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def register(self, parser, handler, encoding='utf-8', on_error=None):
+        """
+        Adds session, the parser must not read its input before.
+
+        :param parser: instance of MachineDialogParser, its input_ has to
+            provide fileno()
+        :param handler: callable handler(parser, event)
+        :param encoding: encoding of the dialog, parser with its own
+            encoding is fed by bytes
+        :param on_error: callable on_error(parser, exception) called when
+            the session fails, the error is logged when it's None
+        """
+        if parser.stream_multi_string:
+            raise ValueError(
+                "Multiplexed parser needs non-streamed multi-string values"
+            )
+        input_ = _SessionInput(parser.input_)
+        session = _Session(parser, handler, input_, encoding, on_error)
+        os.set_blocking(session.fd, False)
+        parser.set_streams(input_, parser.output)
+        self._selector.register(session.fd, selectors.EVENT_READ, session)
+        self._sessions[parser] = session
+
+    def unregister(self, parser):
+        """
+        Removes session, input of parser is restored, so the parser can
+        continue the dialog by itself. Character split by last read of
+        text session is completed first, so it waits for its rest.
+
+        :param parser: registered instance of MachineDialogParser
+        """
+        session = self._sessions[parser]
+        if session.decoder is not None:
+            self._complete_character(session)
+        self._remove(session)
+
+    def _remove(self, session):
+        parser = session.parser
+        del self._sessions[parser]
+        self._selector.unregister(session.fd)
+        os.set_blocking(session.fd, session.blocking)
+        # data received by session are kept by protocol of parser
+        parser.set_streams(session.input_.stream, parser.output, reset=False)
+
+    def _complete_character(self, session):
+        """
+        Reads rest of character split by last read of session, parser
+        reads decoded text from its stream, so it can't complete it.
+        """
+        decoder = session.decoder
+        while decoder.getstate()[0]:
+            select.select([session.fd], [], [])
+            data = os.read(session.fd, 1)
+            session.parser._feed(decoder.decode(data, not data))
+            if not data:
+                break
+
+    def poll(self, timeout=None):
+        """
+        Reads ready sessions and dispatches their events.
+
+        :param timeout: maximal time to wait in seconds, None means forever
+        :return: number of dispatched events
+        """
+        dispatched = 0
+        for key, _ in self._selector.select(timeout):
+            dispatched += self._read(key.data)
+        return dispatched
+
+    def run(self):
+        """
+        Dispatches events until all sessions reach end of input.
+        """
+        while self._sessions:
+            self.poll()
+
+    def _fail(self, session, error):
+        """
+        Unregisters failed session and reports its error.
+        """
+        parser = session.parser
+        if self._sessions.get(parser) is session:
+            self._remove(session)
+        if session.on_error is None:
+            self.logger.error(
+                "Session %s failed: %s", parser, error, exc_info=True,
+            )
+        else:
+            session.on_error(parser, error)
+
+    def _read(self, session):
+        try:
+            data = os.read(session.fd, self.read_size)
+        except OSError as ex:
+            if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            self._fail(session, ex)
+            return 0
+        try:
+            if session.decoder is None:
+                if data:
+                    session.parser._feed(data)
+            elif data:
+                session.parser._feed(session.decoder.decode(data))
+            else:
+                session.parser._feed(session.decoder.decode(b'', True))
+        except Exception as ex:
+            self._fail(session, ex)
+            return 0
+        if not data:
+            session.input_.eof = True
+            session.parser.protocol.receive_eof()
+        return self._dispatch(session)
+
+    def _dispatch(self, session):
+        """
+        Passes all completed events of session to its handler, progress
+        of incomplete event is kept by protocol of parser.
+        """
+        parser = session.parser
+        dispatched = 0
+        while True:
+            if session.input_.eof and parser.protocol.idle:
+                self._remove(session)
+                self.logger.debug("Session %s reached end of input", parser)
+                break
+            try:
+                event = parser.next_event()
+                if event is not None:
+                    session.handler(parser, event)
+            except _WouldBlock:
+                break
+            except Exception as ex:
+                self._fail(session, ex)
+                break
+            if event is not None:
+                dispatched += 1
+        return dispatched
@@ -24,31 +24,162 @@ Please refer to README.dialog.
 """
 
 
+import io
+import os
+import time
+import errno
+import fcntl
+import select
+import logging
+import contextlib
 import six
-from otopi import base
-from otopi import util
+from otopimdp import base
 from otopimdp import errors
 from otopimdp import constants as c
+from otopimdp import events
+from otopimdp import metrics as m
+from otopimdp import protocol
 from otopimdp import utils
+from otopimdp.protocol import _DialogGrammar
 
 
-@util.export
-class MachineDialogParser(base.Base):
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# file object of python 2, its readline() loses partial line when
+# non-blocking read fails
+_PY2_FILE = getattr(six.moves.builtins, 'file', ())
+
+# replies checked against QValidValues, as by send_response
+_CHECKED_REPLIES = frozenset((c.QUERY_STRING_EVENT, c.QUERY_VALUE_EVENT))
+
+
+@base.export
+class AnswerTable(dict):
+    """
+    Replies encoded by rules of send_response, keyed by tuple
+    (event type, name of query or what of confirm).
+
+    Reply of QUERY_MULTI_STRING doesn't contain its boundary, it is
+    appended when the query arrives. Replies as they were given are kept
+    in values, so they can be checked against QValidValues of the query.
+    """
+
+    def __init__(self, answers=()):
+        """
+        Keyword arguments:
+        answers -- dict {(event type, name): reply}
+        """
+        super(AnswerTable, self).__init__()
+        # {(event type, name): reply before encoding}
+        self.values = {}
+        for (event_type, name), reply in dict(answers).items():
+            self.add(event_type, name, reply)
+
+    def add(self, event_type, name, reply):
+        """
+        Encodes reply for given query.
+
+        :param event_type: type of replyable event
+        :param name: name of query or what of confirm
+        :param reply: value as it would be set to REPLY_KEY of the event
+        """
+        if event_type not in _DialogGrammar.REPLY_NAME_KEYS:
+            raise TypeError("%s is not replayable" % event_type)
+        event = events.EVENT_CLASSES[event_type](
+            attributes={'name': name, 'what': name, 'boundary': ''},
+        )
+        event[c.REPLY_KEY] = reply
+        self[(event_type, name)] = _DialogGrammar._send_response(event)
+        self.values[(event_type, name)] = reply
+
+
+@base.export
+class MachineDialogParser(_DialogGrammar):
     """
     Machine dialog parser.
     """
 
-    def __init__(self, input_=None, output=None):
+    def __init__(
+        self, input_=None, output=None, buffer_size=io.DEFAULT_BUFFER_SIZE,
+        stream_multi_string=False, flush_policy=c.FLUSH_BATCH,
+        env_cache_size=0, env_cache_invalidated_by=(), metrics=None,
+        encoding=None, errors='strict', session_timeout=None,
+        subscribed=None, log_sink=None,
+    ):
         """
         Keyword arguments:
         input_ -- file like object
         output -- file like object
+        buffer_size -- maximal size of chunk read from input_ at once,
+            0 reads input_ character by character
+        stream_multi_string -- value of DISPLAY_MULTI_STRING event is lazy
+            iterator of lines instead of list, it has to be consumed before
+            next event is requested otherwise remaining lines are skipped
+        flush_policy -- when written messages are flushed,
+            FLUSH_MESSAGE flushes every message,
+            FLUSH_BATCH joins messages written within batch() into single
+            write, otherwise it flushes every message,
+            FLUSH_EXPLICIT keeps messages until flush() is called or until
+            next event is requested
+        env_cache_size -- number of environment values cached by
+            cli_env_get and cli_env_set, 0 disables the cache
+        env_cache_invalidated_by -- types of events which invalidate the
+            cache, it is invalidated by cli_install and cli_abort too
+        metrics -- instance of otopimdp.metrics.Metrics collecting
+            counters and latencies of the session
+        encoding -- when given, input_ and output are binary streams,
+            lines are parsed as bytes and only extracted values are
+            decoded, replies are encoded by it
+        errors -- error policy of decoding, see codecs
+        session_timeout -- number of seconds after which reading of input_
+            raises DialogTimeoutError, see deadline, input_ has to provide
+            fileno()
+        subscribed -- types of events returned by next_event, other events
+            are skipped without parsing and counted, None returns all,
+            see DialogProtocol.subscribed. cli_* methods need the events
+            they wait for, e.g. cli_env_get needs DISPLAY_VALUE_EVENT.
+        log_sink -- callable log_sink(severity, record) receiving records
+            of LOG lines, their events aren't created nor returned, see
+            otopimdp.logsink
         """
         super(MachineDialogParser, self).__init__()
+        self.protocol = protocol.DialogProtocol(encoding, errors, subscribed)
+        self.protocol.log_sink = log_sink
         self.output = None
         self.input_ = None
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self.errors = errors
+        self.stream_multi_string = stream_multi_string
+        self.flush_policy = flush_policy
+        self.env_cache = None
+        if env_cache_size:
+            self.env_cache = utils.LRUCache(env_cache_size)
+        self.env_cache_invalidated_by = frozenset(env_cache_invalidated_by)
+        self.metrics = metrics
+        # (query, time it was returned) for latency of its reply
+        self._query = None
+        self._pending = []
+        self._batch_depth = 0
+        # time.monotonic() after which reads raise DialogTimeoutError
+        self.deadline = None
+        if session_timeout is not None:
+            self.deadline = _monotonic() + session_timeout
+        # deadline of current next_event(timeout)
+        self._event_deadline = None
         self.set_streams(input_, output)
 
+    @property
+    def metrics(self):
+        """
+        Instance of otopimdp.metrics.Metrics or None
+        """
+        return self.protocol.metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self.protocol.metrics = metrics
+
     def _write(self, data):
         """
         Writes data to output stream
@@ -56,148 +187,264 @@ class MachineDialogParser(base.Base):
         Keyword arguments:
         data -- string to be written
         """
-        self.logger.debug("writing data {{{\n%s\n}}}", data)
-        self.output.write(data)
-        self.output.write('\n')
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("writing data {{{\n%s\n}}}", data)
+        data += '\n'
+        if self.encoding is not None:
+            data = data.encode(self.encoding)
+        if (
+            self.flush_policy == c.FLUSH_EXPLICIT or
+            self._batch_depth and self.flush_policy == c.FLUSH_BATCH
+        ):
+            self._pending.append(data)
+        else:
+            self.output.write(data)
+            self.output.flush()
+
+    def flush(self):
+        """
+        Writes pending messages by single write and flushes output
+        """
+        if self._pending:
+            self.output.write(self.protocol._empty.join(self._pending))
+            del self._pending[:]
         self.output.flush()
 
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager, messages written within it are joined into single
+        write when flush_policy is FLUSH_BATCH.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._pending and (
+                self.flush_policy == c.FLUSH_BATCH
+            ):
+                self.flush()
+
+    def _read_chunk(self, deadline=None):
+        """
+        Reads chunk of data from input.
+
+        Input is read by readline() which doesn't wait for more data than
+        a single line (or read1() in bytes mode), so it never blocks when
+        otopi waits for our reply.
+
+        :param deadline: time.monotonic() after which DialogTimeoutError is
+            raised, see _read_before
+        """
+        size = self.buffer_size or 1
+        if deadline is not None:
+            def read(size):
+                return self._read_before(size, deadline)
+        elif not self.buffer_size:
+            read = self.input_.read
+        elif self.encoding is None:
+            read = self.input_.readline
+        else:
+            read = getattr(self.input_, 'read1', None) or self.input_.readline
+        if self.metrics is None:
+            return read(size)
+        start = m.timer()
+        chunk = read(size)
+        self.metrics.observe(m.READ_WAIT, m.timer() - start)
+        self.metrics.count(m.BYTES_READ, len(chunk))
+        return chunk
+
+    def _read_before(self, size, deadline):
+        """
+        Reads available data, file descriptor of input is waited for until
+        deadline.
+
+        Input is read in non-blocking mode, so data buffered by the stream
+        are read first and the descriptor is waited for only when the
+        stream has nothing more.
+        """
+        if self._fd is None:
+            raise ValueError(
+                "Input without file descriptor can't be read with "
+                "timeout: %r" % (self.input_,)
+            )
+        input_ = self.input_
+        text = self.encoding is None and not isinstance(input_, _PY2_FILE)
+        if text:
+            read = input_.readline
+        else:
+            read = getattr(input_, 'read1', None) or input_.read
+        waited = False
+        while True:
+            chunk = self._read_nonblocking(read, size)
+            if chunk:
+                return chunk
+            if waited and chunk is not None:
+                # readable input without data is at its end, text stream
+                # may keep incomplete character which read() completes
+                return input_.read(1) if text else chunk
+            self._wait(deadline)
+            waited = True
+
+    def _read_nonblocking(self, read, size):
+        """
+        Returns read(size) called in non-blocking mode, None when it would
+        block.
+        """
+        flags = fcntl.fcntl(self._fd, fcntl.F_GETFL)
+        fcntl.fcntl(self._fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        try:
+            return read(size)
+        except (IOError, OSError) as ex:
+            if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return None
+            raise
+        finally:
+            fcntl.fcntl(self._fd, fcntl.F_SETFL, flags)
+
+    def _wait(self, deadline):
+        """
+        Waits until input is readable, raises DialogTimeoutError when
+        deadline passes first.
+        """
+        timeout = max(deadline - _monotonic(), 0)
+        if self._poller is not None:
+            ready = self._poller.poll(timeout * 1000)
+        else:
+            ready = select.select([self._fd], [], [], timeout)[0]
+        if not ready:
+            raise errors.DialogTimeoutError(
+                "No data from input within deadline"
+            )
+
+    def _receive(self):
+        """
+        Passes chunk of input to protocol
+        """
+        deadline = self.deadline
+        if self._event_deadline is not None and (
+            deadline is None or self._event_deadline < deadline
+        ):
+            deadline = self._event_deadline
+        chunk = self._read_chunk(deadline)
+        if chunk:
+            self.protocol.receive_data(chunk)
+        else:
+            self.protocol.receive_eof()
+
+    def _feed(self, data):
+        """
+        Passes data to protocol, see otopimdp.multiplexer
+        """
+        if self.metrics is not None:
+            self.metrics.count(m.BYTES_READ, len(data))
+        self.protocol.receive_data(data)
+
     def next_line(self):
         """
         Returns next line from input
         """
-        line = ""
         while True:
-            char = self.input_.read(1)
-            if char == '\r':
-                continue
-            if not char:
-                if not line:
-                    raise errors.UnexpectedEOF()
-                return line
-            if char == '\n':
+            line = self.protocol.next_line()
+            if line is not protocol.NEED_DATA:
                 return line
-            line += char
+            self._receive()
+
+    def set_streams(self, input_, output, reset=True):
+        """
+        Sets streams of the dialog.
 
-    def set_streams(self, input_, output):
+        :param reset: drops received data, progress of incomplete event
+            and pending messages, False continues the dialog on new streams
+        """
         self.input_ = input_
         self.output = output
-
-    def next_event(self):
+        # file descriptor waited for by reads with deadline
+        self._fd = None
+        self._poller = None
+        try:
+            self._fd = input_.fileno()
+        except (AttributeError, io.UnsupportedOperation, ValueError):
+            pass
+        if self._fd is not None and hasattr(select, 'poll'):
+            self._poller = select.poll()
+            self._poller.register(self._fd, select.POLLIN)
+        if reset:
+            self._pending = []
+            self._query = None
+            self.protocol.reset()
+
+    def next_event(self, timeout=None):
         """
         Returns instance of Event
-        """
-        return self._next_event()
 
-    def _next_event(self, line=None):
-        if not line:
-            line = self.next_line()
-        for event_type in c.TRANSLATION:
-            match = event_type[c.REGEX_KEY].match(line)
-            if not match:
-                continue
-            event = dict(
-                (
-                    (c.TYPE_KEY, event_type[c.TYPE_KEY]),
-                    (c.ATTRIBUTES_KEY, match.groupdict()),
-                )
-            )
-            self._process_event(event)
-            self.logger.debug("Next event: %s", event)
-            return event
-        # W/A for hosted-engine deploy job
-        self.logger.warning("This line doesn't match no event: %s", line)
-
-    def _process_event(self, event):
-        event_type = event[c.TYPE_KEY]
-        attributes = event[c.ATTRIBUTES_KEY]
-
-        if event_type == c.DISPLAY_VALUE_EVENT:
-            type_ = attributes['type'].lower()
-            if type_ == 'none':
-                attributes['value'] = None
-            elif type_ == 'str':
-                attributes['value'] = str(attributes['value'])
-            elif type_ == 'int':
-                attributes['value'] = int(attributes['value'])
-            elif type_ == 'bool':
-                attributes['value'] = attributes['value'].lower() == "true"
-            else:
-                raise TypeError(
-                    "Unexpected type of %s.value: '%s'" % (
-                        c.DISPLAY_VALUE_EVENT,
-                        attributes['value']
-                    )
-                )
-
-        if event_type == c.DISPLAY_MULTI_STRING_EVENT:
-            lines = []
-            while True:
-                line = self.next_line()
-                if line != attributes['boundary']:
-                    lines.append(line)
-                else:
-                    break
-            attributes['value'] = lines
-
-        if event_type == c.QUERY_FRAME_EVENT:
-            self._process_frame_event(event)
-
-    def _process_frame_event(self, event):
-        attributes = event[c.ATTRIBUTES_KEY]
-        framed_event = None
+        :param timeout: maximal number of seconds to wait for the event,
+            DialogTimeoutError is raised when it passes, the event can be
+            requested again or the dialog can be aborted then
+        :raises ValueError: when timeout is given for input without
+            fileno()
+        """
+        if timeout is None:
+            return self._next_event()
+        self._event_deadline = _monotonic() + timeout
+        try:
+            return self._next_event()
+        finally:
+            self._event_deadline = None
+
+    def _next_event(self, stream=None):
+        if self._pending:
+            self.flush()
+        if stream is None:
+            stream = self.stream_multi_string
+        metrics = self.metrics
+        if metrics is None:
+            return self._read_event(stream)
+        # time blocked by reading isn't counted as parsing
+        read_wait = metrics.histograms[m.READ_WAIT]
+        waited = read_wait.sum
+        start = m.timer()
+        event = self._read_event(stream)
+        elapsed = m.timer() - start - (read_wait.sum - waited)
+        if event is None:
+            return None
+        metrics.count_event(event.type)
+        metrics.observe(m.PARSE_TIME, elapsed)
+        if event.type in self.REPLY_NAME_KEYS:
+            self._query = (event, m.timer())
+        return event
+
+    def _read_event(self, stream):
         while True:
-            line = self.next_line()
-            m = c.QUERY_FRAME_PATTERNS[c.QUERY_FRAME_PART_END].match(line)
-            if m:
-                if m.group(c.FRAME_NAME_KEY) != attributes[c.FRAME_NAME_KEY]:
-                    self.logger.warning(
-                        "The QStart:NAME != QEnd:NAME (%s != %s)",
-                        m.group(c.FRAME_NAME_KEY),
-                        attributes[c.FRAME_NAME_KEY],
-                    )
+            event = self.protocol.next_event(stream)
+            if event is not protocol.NEED_DATA:
                 break
-            m = c.QUERY_FRAME_PATTERNS[c.QUERY_FRAME_PART_DEFAULT].match(line)
-            if m:
-                attributes[c.DEFAULT_KEY] = m.group(c.DEFAULT_KEY)
-                continue
-            m = c.QUERY_FRAME_PATTERNS[c.QUERY_FRAME_PART_HIDDEN].match(line)
-            if m:
-                if m.group(c.HIDDEN_KEY) == "TRUE":
-                    attributes[c.HIDDEN_KEY] = True
-                elif m.group(c.HIDDEN_KEY) == "FALSE":
-                    attributes[c.HIDDEN_KEY] = False
-                else:
-                    self.logger.warning(
-                        "The QHidden(%s) has invalid option: "
-                        "%s not in (TRUE, FALSE)",
-                        attributes[c.FRAME_NAME_KEY],
-                        m.group(c.HIDDEN_KEY),
-                    )
-                    attributes[c.HIDDEN_KEY] = False
-                continue
-            m = c.QUERY_FRAME_PATTERNS[
-                c.QUERY_FRAME_PART_VALID_VALUES
-            ].match(line)
-            if m:
-                attributes[c.VALID_VALUES_KEY] = utils.split_valid_options(
-                    m.group('valid')
-                )
-                continue
-
-            framed_event = self._next_event(line)
-            if framed_event is None:
-                raise errors.UnexpectedInputError(
-                    c.QUERY_FRAME_EVENT, attributes, line,
-                )
-
-            event[c.ATTRIBUTES_KEY].update(framed_event[c.ATTRIBUTES_KEY])
-            event[c.TYPE_KEY] = framed_event[c.TYPE_KEY]
+            self._receive()
+        if event is None:
+            return None
+        if stream and event.type == c.DISPLAY_MULTI_STRING_EVENT:
+            event.attributes['value'] = self._iter_multi_string()
+        if self.env_cache is not None and (
+            event.type in self.env_cache_invalidated_by
+        ):
+            self.env_cache.invalidate()
+        self.logger.debug("Next event: %s", event)
+        return event
 
-        if framed_event is None:
-            raise errors.IncompleteQueryFrameError(
-                "The frame %s doesn't contain query.",
-                event,
-            )
+    def _iter_multi_string(self):
+        """
+        Yields lines of streamed multi-string value, lines which weren't
+        consumed are skipped by protocol when next event is requested
+        """
+        while True:
+            line = self.protocol.next_value_line()
+            if line is None:
+                break
+            if line is protocol.NEED_DATA:
+                self._receive()
+            else:
+                yield line
 
     def send_response(self, event):
         """
@@ -206,53 +453,64 @@ class MachineDialogParser(base.Base):
         :param event: instance of replyable event
         """
         self.logger.debug("Response for: %s", event)
-        self._write(self._send_response(event))
-
-    @staticmethod
-    def _send_response(event):
-        type_ = event[c.TYPE_KEY]
-        if type_ == c.QUERY_STRING_EVENT:
-            reply = event[c.REPLY_KEY]
-            if not isinstance(reply, six.string_types) or '\n' in reply:
-                raise TypeError(
-                    "QueryString.value must be single-line string, "
-                    "got: %s" % reply
-                )
-            return reply
-        elif type_ == c.QUERY_MULTI_STRING_EVENT:
-            if event.get(c.ABORT_KEY, False):
-                return event[c.ATTRIBUTES_KEY]['abort_boundary']
-            lines = '\n'.join(event.get(c.REPLY_KEY, list()))
-            if lines:
-                return "%s\n%s" % (lines, event[c.ATTRIBUTES_KEY]['boundary'])
-            return event[c.ATTRIBUTES_KEY]['boundary']
-        elif type_ == c.QUERY_VALUE_EVENT:
-            if event.get(c.ABORT_KEY, False):
-                return "ABORT %s" % event[c.ATTRIBUTES_KEY]['name']
-            reply = event[c.REPLY_KEY]
-            value_type = type(reply).__name__
-            if value_type == 'NoneType':
-                value_type = 'none'
-            if value_type == 'str' and '\n' in reply:
-                raise TypeError(
-                    ("String '%s' should not contain new lines" %
-                        event[c.ATTRIBUTES_KEY]['name']
-                     )
-                )
-            if value_type not in ('none', 'str', 'bool', 'int'):
-                raise TypeError("Invalid type of value: %s" % value_type)
-            return "VALUE %s=%s:%s" % (
-                event[c.ATTRIBUTES_KEY]['name'],
-                value_type,
-                reply
-            )
-        elif type_ == c.CONFIRM_EVENT:
-            if event.get(c.ABORT_KEY, False):
-                return "ABORT %s" % event[c.ATTRIBUTES_KEY]['what']
-            reply = "yes" if event.get(c.REPLY_KEY, False) else "no"
-            return "CONFIRM %s=%s" % (event[c.ATTRIBUTES_KEY]['what'], reply)
-        else:
-            raise TypeError("%s is not replayable" % type_)
+        self._write_reply(self._send_response(event), event)
+
+    def _write_reply(self, data, event=None):
+        """
+        Writes reply, it is counted by metrics with latency since the
+        event was returned.
+        """
+        self._write(data)
+        if self.metrics is not None:
+            self.metrics.count(m.REPLIES_SENT)
+            if self._query is not None and self._query[0] is event:
+                self.metrics.observe(m.REPLY_DELAY, m.timer() - self._query[1])
+                self._query = None
+
+    def run(self, answers, fallback=None, observer=None):
+        """
+        Replies to queries by given answers until TERMINATE event.
+
+        :param answers: instance of AnswerTable or dict accepted by it
+        :param fallback: callable fallback(parser, event) called for queries
+            without answer, UnexpectedEventError is raised for them when
+            it is None
+        :param observer: callable observer(parser, event) called for events
+            which aren't queries, except TERMINATE
+        :return: TERMINATE event
+        :raises InvalidReplyError: when answer isn't one of QValidValues
+            of the query, it is raised before the answer is written
+        """
+        if not isinstance(answers, AnswerTable):
+            answers = AnswerTable(answers)
+        name_keys = self.REPLY_NAME_KEYS
+        while True:
+            event = self.next_event()
+            if event is None:
+                continue
+            event_type = event.type
+            name_key = name_keys.get(event_type)
+            if name_key is None:
+                if event_type == c.TERMINATE_EVENT:
+                    return event
+                if observer is not None:
+                    observer(self, event)
+                continue
+            attributes = event.attributes
+            key = (event_type, attributes[name_key])
+            reply = answers.get(key)
+            if reply is None:
+                if fallback is None:
+                    raise errors.UnexpectedEventError(event)
+                fallback(self, event)
+                continue
+            if attributes.get(c.VALID_VALUES_SET_KEY) and (
+                event_type in _CHECKED_REPLIES and key in answers.values
+            ):
+                self._check_valid_value(event, answers.values[key])
+            if event_type == c.QUERY_MULTI_STRING_EVENT:
+                reply += attributes['boundary']
+            self._write_reply(reply, event)
 
     # NOTE: all these methods doesn't fit here,
     # I would move it to separate class.
@@ -265,16 +523,22 @@ class MachineDialogParser(base.Base):
         :return: returns value for environment variable
         :rtype: str
         """
+        value = self._cached_env(key)
+        if value is not utils.LRUCache.MISSING:
+            return value
+
         cmd = 'env-get -k %s' % key
         self._write(cmd)
 
         event = self.next_event()
-        if event[c.TYPE_KEY] not in (
-            c.DISPLAY_VALUE_EVENT,
-            c.DISPLAY_MULTI_STRING_EVENT,
-        ):
+        if event[c.TYPE_KEY] not in self.DISPLAY_EVENTS:
             raise errors.UnexpectedEventError(event)
-        return event[c.ATTRIBUTES_KEY]['value']
+        value = event[c.ATTRIBUTES_KEY]['value']
+        if event[c.TYPE_KEY] == c.DISPLAY_VALUE_EVENT or (
+            not self.stream_multi_string
+        ):
+            self._cache_env(key, value)
+        return value
 
     def cli_env_set(self, key, value):
         """
@@ -285,30 +549,189 @@ class MachineDialogParser(base.Base):
         :param value: value to be set
         :type value: str
         """
-        cmd = 'env-query'
-        if isinstance(value, (list, tuple)):
-            cmd += '-multi'
-        cmd += " -k %s" % key
-        self._write(cmd)
+        self._write(self._env_query_command(key, value))
 
         event = self.next_event()
-        if event[c.TYPE_KEY] not in (
-            c.QUERY_STRING_EVENT,
-            c.QUERY_MULTI_STRING_EVENT,
-            c.QUERY_VALUE_EVENT,
-        ):
+        if event[c.TYPE_KEY] not in self.QUERY_EVENTS:
             raise errors.UnexpectedEventError(event)
         event[c.REPLY_KEY] = value
         self.send_response(event)
+        self._cache_env(key, value)
 
-    def cli_download_log(self):
+    def _cached_env(self, key):
+        """
+        Returns cached value of environment variable or LRUCache.MISSING
+        """
+        if self.env_cache is None:
+            return utils.LRUCache.MISSING
+        value = self.env_cache.get(key)
+        if isinstance(value, list):
+            value = list(value)
+        return value
+
+    def _cache_env(self, key, value):
+        if self.env_cache is not None:
+            if isinstance(value, (list, tuple)):
+                value = list(value)
+            self.env_cache.set(key, value)
+
+    def cli_env_get_many(self, keys):
+        """
+        Get values of environment variables, all commands are written at
+        once and their replies are read in order
+
+        :param keys: names of variables
+        :type keys: list
+        :return: returns values of environment variables
+        :rtype: dict
+        :raises UnexpectedEventError: for the first key without value, it
+            is raised after replies for all keys are read, or at once when
+            otopi doesn't prompt for next command
+        """
+        values = {}
+        missing = []
+        for key in keys:
+            value = self._cached_env(key)
+            if value is utils.LRUCache.MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+        keys = missing
+        with self.batch():
+            for key in keys:
+                self._write('env-get -k %s' % key)
+
+        failed = None
+        replied = False
+        for key in keys:
+            event, replied = self._read_reply(
+                key, self.DISPLAY_EVENTS, replied,
+            )
+            if replied:
+                values[key] = event[c.ATTRIBUTES_KEY]['value']
+                self._cache_env(key, values[key])
+            elif failed is None:
+                failed = (event, key)
+        if failed is not None:
+            raise errors.UnexpectedEventError(*failed)
+        return values
+
+    def cli_env_set_many(self, items):
+        """
+        Sets given values for given environment variables, queries are
+        read in order.
+
+        Unlike cli_env_get_many it isn't pipelined, every variable costs
+        a round trip. Reply is written only after its query arrives,
+        otherwise otopi would read it as command when the query is
+        refused. It is written together with the command for next
+        variable, so every variable costs single write.
+
+        :param items: dict or sequence of (key, value)
+        :raises UnexpectedEventError: for the first key which wasn't
+            queried, it is raised after queries for all keys are read, or
+            at once when otopi doesn't prompt for next command
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        # replies are encoded before anything is written
+        items = [
+            (key, value, self._env_set_reply(key, value))
+            for key, value in items
+        ]
+
+        failed = None
+        replied = False
+        # arguments of _write_reply for confirmed query which wasn't
+        # written yet
+        pending = None
+        for key, value, reply in items:
+            with self.batch():
+                if pending is not None:
+                    self._write_reply(*pending)
+                    pending = None
+                self._write(self._env_query_command(key, value))
+            if reply is None:
+                types = (c.QUERY_MULTI_STRING_EVENT,)
+            else:
+                types = (c.QUERY_VALUE_EVENT,)
+            event, replied = self._read_reply(key, types, replied)
+            if not replied:
+                if failed is None:
+                    failed = (event, key)
+                continue
+            if reply is None:
+                event[c.REPLY_KEY] = value
+                pending = (self._send_response(event), event)
+            else:
+                pending = (reply, None)
+            self._cache_env(key, value)
+        if pending is not None:
+            self._write_reply(*pending)
+        if failed is not None:
+            raise errors.UnexpectedEventError(*failed)
+
+    def _env_set_reply(self, key, value):
+        """
+        Returns reply for env-query of single-line value, None for
+        multi-string value.
+        """
+        if isinstance(value, (list, tuple)):
+            return None
+        event = events.QueryValueEvent({'name': key})
+        event[c.REPLY_KEY] = value
+        return self._send_response(event)
+
+    def _read_reply(self, key, types, separated):
+        """
+        Reads event replying command for key, returns tuple (event, True)
+        or (event, False) when the command failed, the event is then
+        the prompt for next command.
+
+        :param separated: prompt precedes the reply
+        :raises UnexpectedEventError: when the prompt is another event,
+            replies can't be matched to their keys then
+        """
+        if separated:
+            prompt = self._next_significant_event()
+            if prompt[c.TYPE_KEY] != c.QUERY_STRING_EVENT:
+                raise errors.UnexpectedEventError(prompt, key)
+        event = self._next_significant_event()
+        replied = (
+            event[c.TYPE_KEY] in types and
+            event[c.ATTRIBUTES_KEY].get('name') == key
+        )
+        return event, replied
+
+    def _next_significant_event(self):
+        """
+        Returns next event skipping notes and logs
+        """
+        while True:
+            event = self._next_event(stream=False)
+            if event is not None and event[c.TYPE_KEY] not in (
+                c.NOTE_EVENT, c.LOG_EVENT,
+            ):
+                return event
+
+    def cli_download_log(self, dest=None):
         """
         Returns log
+
+        :param dest: file like object, when given the log is written into
+            it line by line and nothing is returned
         """
         self._write('log')
-        event = self.next_event()
+        if dest is None:
+            event = self.next_event()
+        else:
+            event = self._next_event(stream=True)
         if event[c.TYPE_KEY] == c.DISPLAY_MULTI_STRING_EVENT:
-            return '\n'.join(event[c.ATTRIBUTES_KEY]['value']) + '\n'
+            lines = event[c.ATTRIBUTES_KEY]['value']
+            if dest is None:
+                return '\n'.join(lines) + '\n'
+            dest.writelines(line + '\n' for line in lines)
+            return None
         raise errors.UnexpectedEventError(event)
 
     def cli_noop(self):
@@ -328,9 +751,13 @@ class MachineDialogParser(base.Base):
         install command
         """
         self._write('install')
+        if self.env_cache is not None:
+            self.env_cache.invalidate()
 
     def cli_abort(self):
         """
         abort command
         """
         self._write('abort')
+        if self.env_cache is not None:
+            self.env_cache.invalidate()
@@ -0,0 +1,581 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements machine dialog grammar without any I/O.
+
+DialogProtocol is fed by chunks of data and returns completed events,
+it is shared by blocking, asyncio and multiplexed parsers which only
+differ in the way they read data.
+"""
+
+
+import six
+from otopimdp import base
+from otopimdp import errors
+from otopimdp import constants as c
+from otopimdp import classifier
+from otopimdp import events
+from otopimdp import metrics as m
+from otopimdp import utils
+
+
+# returned when more data has to be received to complete event or line
+NEED_DATA = object()
+
+# placeholder of multi-string event which isn't subscribed
+_SKIPPED_MULTI_STRING = events.DisplayMultiStringEvent(attributes={})
+
+_LOG_PREFIX_LENGTH = len(next(
+    entry[c.PREFIX_KEY] for entry in c.TRANSLATION
+    if entry[c.TYPE_KEY] == c.LOG_EVENT
+))
+
+# every directive of query frame starts by it, see QUERY_FRAME_PATTERNS
+_FRAME_DIRECTIVE_PREFIX = '**%Q'
+_FRAME_KEYWORD_START = len(_FRAME_DIRECTIVE_PREFIX)
+
+
+class _DialogGrammar(base.Base):
+    """
+    Parts of machine dialog grammar which don't do any I/O, they are shared
+    by blocking and asyncio parsers.
+    """
+
+    DISPLAY_EVENTS = (
+        c.DISPLAY_VALUE_EVENT,
+        c.DISPLAY_MULTI_STRING_EVENT,
+    )
+    QUERY_EVENTS = (
+        c.QUERY_STRING_EVENT,
+        c.QUERY_MULTI_STRING_EVENT,
+        c.QUERY_VALUE_EVENT,
+    )
+    # replyable event type -> attribute naming the query
+    REPLY_NAME_KEYS = {
+        c.QUERY_STRING_EVENT: 'name',
+        c.QUERY_MULTI_STRING_EVENT: 'name',
+        c.QUERY_VALUE_EVENT: 'name',
+        c.CONFIRM_EVENT: 'what',
+    }
+
+    # instance of otopimdp.metrics.Metrics
+    metrics = None
+
+    def __init__(self):
+        super(_DialogGrammar, self).__init__()
+        self.classifier = classifier.DEFAULT_CLASSIFIER
+        # (encoding, errors) of values of bytes lines
+        self._decode = None
+
+    def _create_event(self, line, text=False):
+        """
+        Returns event for given line or None when the line doesn't match
+        any event. Multi-line events have to be completed by caller.
+
+        :param text: line is decoded even when the parser reads bytes
+        """
+        if text:
+            classifier_, decode = classifier.DEFAULT_CLASSIFIER, None
+        else:
+            classifier_, decode = self.classifier, self._decode
+        classified = classifier_.classify(line)
+        if classified is None:
+            # W/A for hosted-engine deploy job
+            self.logger.warning("This line doesn't match no event: %s", line)
+            if self.metrics is not None:
+                self.metrics.count(m.UNMATCHED_LINES)
+            return None
+        event_type, match = classified
+        return events.EVENT_CLASSES[event_type](match=match, decode=decode)
+
+    def _process_frame_line(self, frame, line):
+        """
+        Processes line of query frame, returns True when the frame ends.
+        The framed query is stored in frame.query, it shares attributes
+        with the frame.
+
+        Directives are dispatched by their keyword, other lines are framed
+        events.
+        """
+        attributes = frame.attributes
+        if line.startswith(_FRAME_DIRECTIVE_PREFIX):
+            keyword, sep, value = line[_FRAME_KEYWORD_START:].partition(': ')
+            directive = _FRAME_DIRECTIVES.get(keyword) if sep else None
+            if directive is not None:
+                return directive(self, frame, attributes, value)
+
+        # lines of frame are decoded, see DialogProtocol.encoding
+        framed_event = self._create_event(line, text=True)
+        if framed_event is None:
+            raise errors.UnexpectedInputError(
+                c.QUERY_FRAME_EVENT, attributes, line,
+            )
+
+        attributes.update(framed_event.attributes)
+        framed_event.attributes = attributes
+        frame.query = framed_event
+        return False
+
+    def _frame_end(self, frame, attributes, name):
+        if name != attributes[c.FRAME_NAME_KEY]:
+            self.logger.warning(
+                "The QStart:NAME != QEnd:NAME (%s != %s)",
+                name,
+                attributes[c.FRAME_NAME_KEY],
+            )
+        if frame.query is None:
+            raise errors.IncompleteQueryFrameError(
+                "The frame %s doesn't contain query.",
+                frame,
+            )
+        return True
+
+    def _frame_default(self, frame, attributes, default):
+        attributes[c.DEFAULT_KEY] = default
+        return False
+
+    def _frame_hidden(self, frame, attributes, hidden):
+        if hidden == "TRUE":
+            attributes[c.HIDDEN_KEY] = True
+        elif hidden == "FALSE":
+            attributes[c.HIDDEN_KEY] = False
+        else:
+            self.logger.warning(
+                "The QHidden(%s) has invalid option: "
+                "%s not in (TRUE, FALSE)",
+                attributes[c.FRAME_NAME_KEY],
+                hidden,
+            )
+            attributes[c.HIDDEN_KEY] = False
+        return False
+
+    def _frame_valid_values(self, frame, attributes, valid):
+        (
+            attributes[c.VALID_VALUES_KEY],
+            attributes[c.VALID_VALUES_SET_KEY],
+        ) = utils.valid_options(valid)
+        return False
+
+    @staticmethod
+    def _check_valid_value(event, reply):
+        """
+        Raises InvalidReplyError when reply isn't one of QValidValues of
+        the event, otopi would ask the query again.
+        """
+        valid = event.attributes.get(c.VALID_VALUES_SET_KEY)
+        if not valid:
+            return
+        if not isinstance(reply, six.string_types):
+            reply = str(reply)
+        if reply not in valid and reply.lower() not in valid:
+            raise errors.InvalidReplyError(
+                "Reply '%s' of %s isn't in valid values: %s" % (
+                    reply,
+                    event.attributes['name'],
+                    event.attributes[c.VALID_VALUES_KEY],
+                )
+            )
+
+    @staticmethod
+    def _send_response(event):
+        type_ = event[c.TYPE_KEY]
+        if type_ == c.QUERY_STRING_EVENT:
+            reply = event[c.REPLY_KEY]
+            if not isinstance(reply, six.string_types) or '\n' in reply:
+                raise TypeError(
+                    "QueryString.value must be single-line string, "
+                    "got: %s" % reply
+                )
+            _DialogGrammar._check_valid_value(event, reply)
+            return reply
+        elif type_ == c.QUERY_MULTI_STRING_EVENT:
+            if event.get(c.ABORT_KEY, False):
+                return event[c.ATTRIBUTES_KEY]['abort_boundary']
+            lines = '\n'.join(event.get(c.REPLY_KEY, list()))
+            if lines:
+                return "%s\n%s" % (lines, event[c.ATTRIBUTES_KEY]['boundary'])
+            return event[c.ATTRIBUTES_KEY]['boundary']
+        elif type_ == c.QUERY_VALUE_EVENT:
+            if event.get(c.ABORT_KEY, False):
+                return "ABORT %s" % event[c.ATTRIBUTES_KEY]['name']
+            reply = event[c.REPLY_KEY]
+            value_type = type(reply).__name__
+            if value_type == 'NoneType':
+                value_type = 'none'
+            if value_type == 'str' and '\n' in reply:
+                raise TypeError(
+                    ("String '%s' should not contain new lines" %
+                        event[c.ATTRIBUTES_KEY]['name']
+                     )
+                )
+            if value_type not in ('none', 'str', 'bool', 'int'):
+                raise TypeError("Invalid type of value: %s" % value_type)
+            _DialogGrammar._check_valid_value(event, reply)
+            return "VALUE %s=%s:%s" % (
+                event[c.ATTRIBUTES_KEY]['name'],
+                value_type,
+                reply
+            )
+        elif type_ == c.CONFIRM_EVENT:
+            if event.get(c.ABORT_KEY, False):
+                return "ABORT %s" % event[c.ATTRIBUTES_KEY]['what']
+            reply = "yes" if event.get(c.REPLY_KEY, False) else "no"
+            return "CONFIRM %s=%s" % (event[c.ATTRIBUTES_KEY]['what'], reply)
+        else:
+            raise TypeError("%s is not replayable" % type_)
+
+    @staticmethod
+    def _env_query_command(key, value):
+        cmd = 'env-query'
+        if isinstance(value, (list, tuple)):
+            cmd += '-multi'
+        cmd += " -k %s" % key
+        return cmd
+
+
+# keyword of frame directive -> its handler
+_FRAME_DIRECTIVES = {
+    'End': _DialogGrammar._frame_end,
+    'Default': _DialogGrammar._frame_default,
+    'Hidden': _DialogGrammar._frame_hidden,
+    'ValidValues': _DialogGrammar._frame_valid_values,
+}
+
+
+@base.export
+class DialogProtocol(_DialogGrammar):
+    """
+    Incremental parser of machine dialog.
+
+    Data are passed by receive_data() and receive_eof(), next_event()
+    returns completed event, None for line which doesn't match any event
+    or NEED_DATA. Multi-line events (query frames, multi-string values)
+    may span any number of chunks, the progress is kept between calls.
+    """
+
+    NEED_DATA = NEED_DATA
+
+    def __init__(self, encoding=None, errors='strict', subscribed=None):
+        """
+        Keyword arguments:
+        encoding -- when given, data are bytes, lines are classified as
+            bytes and only extracted values are decoded by it
+        errors -- error policy of decoding, see codecs
+        subscribed -- types of returned events, see subscribed
+        """
+        super(DialogProtocol, self).__init__()
+        self.encoding = encoding
+        self.errors = errors
+        if encoding is None:
+            self._empty, self._newline, self._cr = '', '\n', '\r'
+            self._space = ' '
+        else:
+            self.classifier = classifier.EventClassifier(binary=True)
+            self._decode = (encoding, errors)
+            self._empty, self._newline, self._cr = b'', b'\n', b'\r'
+            self._space = b' '
+        self.subscribed = subscribed
+        # number of events which weren't returned as they aren't subscribed
+        self.skipped = 0
+        self.reset()
+
+    # callable log_sink(severity, record) which receives LOG records
+    # instead of LOG events, see otopimdp.logsink
+    log_sink = None
+
+    @property
+    def subscribed(self):
+        """
+        Frozenset of types of returned events, None means all types.
+
+        Lines of other events are recognized by their prefix and skipped
+        without matching, lines of their multi-string values are skipped
+        too. Query frames are always parsed, their query is skipped when
+        its type isn't subscribed.
+        """
+        return self._subscribed
+
+    @subscribed.setter
+    def subscribed(self, types):
+        if types is None:
+            self._subscribed = None
+            self._skip = frozenset()
+        else:
+            self._subscribed = frozenset(types)
+            self._skip = frozenset(
+                entry[c.TYPE_KEY] for entry in c.TRANSLATION
+            ) - self._subscribed - frozenset((c.QUERY_FRAME_EVENT,))
+
+    def reset(self):
+        """
+        Drops received data and progress of incomplete event
+        """
+        self._buffer = self._empty
+        self._pos = 0
+        # parts of line received in previous chunks
+        self._partial = []
+        self._eof = False
+        # incomplete multi-line event
+        self._event = None
+        # lines of multi-string value, None when they are streamed
+        self._lines = None
+        self._boundary = None
+
+    def receive_data(self, data):
+        """
+        Appends chunk of data
+        """
+        if self._pos < len(self._buffer):
+            if data:
+                self._buffer = self._buffer[self._pos:] + data
+            else:
+                return
+        else:
+            self._buffer = data
+        self._pos = 0
+
+    def receive_eof(self):
+        """
+        Marks end of data, last line doesn't need to end with newline
+        """
+        self._eof = True
+
+    @property
+    def idle(self):
+        """
+        True when there is no received data nor incomplete event
+        """
+        return (
+            self._event is None and not self._partial and
+            self._pos >= len(self._buffer)
+        )
+
+    def feed(self, data):
+        """
+        Receives data and returns list of completed events, empty data
+        means end of data.
+
+        :raises UnexpectedEOF: when data end within event
+        """
+        if data:
+            self.receive_data(data)
+        else:
+            self.receive_eof()
+        completed = []
+        while not (self._eof and self.idle):
+            event = self.next_event()
+            if event is NEED_DATA:
+                break
+            if event is not None:
+                completed.append(event)
+        return completed
+
+    def next_line(self):
+        """
+        Returns next line without newline, NEED_DATA when it isn't
+        complete.
+
+        :raises UnexpectedEOF: when there is no line after end of data
+        """
+        end = self._buffer.find(self._newline, self._pos)
+        if end >= 0:
+            line = self._buffer[self._pos:end]
+            self._pos = end + 1
+            if self._partial:
+                self._partial.append(line)
+                line = self._empty.join(self._partial)
+                self._partial = []
+            if self._cr in line:
+                line = line.replace(self._cr, self._empty)
+        else:
+            if self._pos < len(self._buffer):
+                self._partial.append(self._buffer[self._pos:])
+                self._buffer = self._empty
+                self._pos = 0
+            if not self._eof:
+                return NEED_DATA
+            line = self._empty.join(self._partial)
+            self._partial = []
+            if self._cr in line:
+                line = line.replace(self._cr, self._empty)
+            if not line:
+                raise errors.UnexpectedEOF()
+        if self.metrics is not None:
+            self.metrics.count(m.LINES_READ)
+        return line
+
+    def _text(self, line):
+        if self._decode is not None:
+            line = line.decode(*self._decode)
+        return line
+
+    def next_event(self, stream=False):
+        """
+        Returns next event, None when line doesn't match any event or
+        NEED_DATA when event isn't complete.
+
+        :param stream: DISPLAY_MULTI_STRING event is returned without value,
+            its lines are returned by next_value_line(), lines which
+            weren't read are skipped by next call of next_event()
+        """
+        if self._event is not None:
+            if self._lines is None and (
+                self._event.type == c.DISPLAY_MULTI_STRING_EVENT
+            ):
+                if self._event is not _SKIPPED_MULTI_STRING:
+                    self.logger.debug("Skipping unconsumed multi-string value")
+                    self._event = _SKIPPED_MULTI_STRING
+                if not self._skip_value_lines():
+                    return NEED_DATA
+            else:
+                return self._complete_event()
+        skip = self._skip
+        log_sink = self.log_sink
+        while True:
+            line = self.next_line()
+            if line is NEED_DATA:
+                return NEED_DATA
+            if not skip and log_sink is None:
+                break
+            event_type = self.classifier.event_type(line)
+            if event_type == c.LOG_EVENT and log_sink is not None:
+                if self._sink_log(log_sink, line):
+                    continue
+                break
+            if event_type not in skip:
+                break
+            if not self._skip_event(line, event_type):
+                return NEED_DATA
+        event = self._create_event(line)
+        if event is None:
+            return None
+        event_type = event.type
+        if event_type == c.DISPLAY_MULTI_STRING_EVENT:
+            self._event = event
+            # compared with raw lines, decoded boundary may not round trip
+            self._boundary = event._match.group('boundary')
+            if stream:
+                self._lines = None
+                return event
+            self._lines = []
+            return self._complete_event()
+        if event_type == c.QUERY_FRAME_EVENT:
+            self._event = event
+            return self._complete_event()
+        return event
+
+    def _complete_event(self):
+        event = self._event
+        try:
+            if event.type == c.QUERY_FRAME_EVENT:
+                while True:
+                    line = self.next_line()
+                    if line is NEED_DATA:
+                        return NEED_DATA
+                    if self._process_frame_line(event, self._text(line)):
+                        break
+                event = event.query
+                if self._subscribed is not None and (
+                    event.type not in self._subscribed
+                ):
+                    self._count_skipped()
+                    event = None
+            else:
+                lines = self._lines
+                while True:
+                    line = self.next_line()
+                    if line is NEED_DATA:
+                        return NEED_DATA
+                    if line == self._boundary:
+                        break
+                    lines.append(self._text(line))
+                event.attributes['value'] = lines
+        except Exception:
+            self._event = None
+            raise
+        self._event = None
+        self._lines = None
+        return event
+
+    def next_value_line(self):
+        """
+        Returns next line of streamed multi-string value, None after its
+        last line or NEED_DATA.
+        """
+        if self._event is None:
+            return None
+        line = self.next_line()
+        if line is NEED_DATA:
+            return NEED_DATA
+        if line == self._boundary:
+            self._event = None
+            return None
+        return self._text(line)
+
+    def _sink_log(self, log_sink, line):
+        """
+        Passes record of LOG line to log_sink, returns False when the line
+        doesn't match LOG event.
+        """
+        # split as by its pattern: prefix, severity and record
+        severity, sep, record = line[_LOG_PREFIX_LENGTH:].partition(
+            self._space
+        )
+        if not sep or not severity:
+            return False
+        log_sink(self._text(severity), self._text(record))
+        return True
+
+    def _count_skipped(self):
+        self.skipped += 1
+        if self.metrics is not None:
+            self.metrics.count(m.SKIPPED_EVENTS)
+
+    def _skip_event(self, line, event_type):
+        """
+        Skips event which isn't subscribed, returns False when more data
+        are needed to skip its multi-string value.
+        """
+        self._count_skipped()
+        if event_type != c.DISPLAY_MULTI_STRING_EVENT:
+            return True
+        # split as by its pattern: prefix, name and boundary
+        parts = line.split(self._space, 2)
+        if len(parts) < 3 or not parts[1]:
+            return True
+        self._event = _SKIPPED_MULTI_STRING
+        self._boundary = parts[2]
+        self._lines = None
+        return self._skip_value_lines()
+
+    def _skip_value_lines(self):
+        """
+        Skips unread lines of streamed multi-string value, returns False
+        when more data are needed.
+        """
+        boundary = self._boundary
+        while True:
+            line = self.next_line()
+            if line is NEED_DATA:
+                return False
+            if line == boundary:
+                self._event = None
+                return True
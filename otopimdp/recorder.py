@@ -0,0 +1,252 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements recording of machine dialog sessions and their replay.
+
+Recording is stored as JSON lines {"time": ..., "direction": ...,
+"data": ...}, where time is number of seconds since start of the
+recording and direction is INPUT or OUTPUT of the parser. Data of binary
+parsers are decoded by latin-1 and the record has also "binary": true.
+"""
+
+
+import json
+import time
+from otopimdp import base
+from otopimdp import errors
+
+
+INPUT = 'in'
+OUTPUT = 'out'
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class _RecordingStream(object):
+    """
+    Wraps stream of parser and records data passing through it.
+    """
+
+    def __init__(self, stream, recorder, direction):
+        self.stream = stream
+        self.recorder = recorder
+        self.direction = direction
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.recorder.record(self.direction, data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.stream.readline(size)
+        self.recorder.record(self.direction, data)
+        return data
+
+    def write(self, data):
+        self.recorder.record(self.direction, data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def close(self):
+        self.stream.close()
+
+
+@base.export
+class Recorder(object):
+    """
+    Records both directions of machine dialog session.
+    """
+
+    def __init__(self, dest):
+        """
+        Keyword arguments:
+        dest -- text file like object the recording is written into
+        """
+        self.dest = dest
+        self._start = _monotonic()
+        # parser streams bytes
+        self.binary = False
+
+    def wrap(self, parser):
+        """
+        Replaces streams of parser by recording ones, it has to be called
+        before parser reads its input.
+
+        :param parser: instance of MachineDialogParser
+        """
+        self.binary = parser.encoding is not None
+        parser.set_streams(
+            _RecordingStream(parser.input_, self, INPUT),
+            _RecordingStream(parser.output, self, OUTPUT),
+        )
+
+    def record(self, direction, data):
+        if not data:
+            return
+        record = {
+            'time': _monotonic() - self._start,
+            'direction': direction,
+            'data': data,
+        }
+        if self.binary:
+            record['data'] = data.decode('latin-1')
+            record['binary'] = True
+        self.dest.write(json.dumps(record) + '\n')
+
+
+def load(source):
+    """
+    Returns list of records from recording.
+
+    :param source: text file like object with recording
+    """
+    return [json.loads(line) for line in source if line.strip()]
+
+
+def _data(record):
+    if record.get('binary'):
+        return record['data'].encode('latin-1')
+    return record['data']
+
+
+def _binary(records):
+    return any(record.get('binary') for record in records)
+
+
+class _ReplayInput(object):
+    """
+    Provides recorded input of parser, when paced it waits until the data
+    were originally read.
+    """
+
+    def __init__(self, records, pace):
+        self._chunks = [
+            (record['time'], _data(record))
+            for record in records if record['direction'] == INPUT
+        ]
+        self._index = 0
+        if _binary(records):
+            self._empty, self._newline = b'', b'\n'
+        else:
+            self._empty, self._newline = '', '\n'
+        self._data = self._empty
+        self._pace = pace
+        self._start = None
+
+    def _next_chunk(self):
+        if self._index >= len(self._chunks):
+            return False
+        time_, self._data = self._chunks[self._index]
+        self._index += 1
+        if self._pace:
+            if self._start is None:
+                self._start = _monotonic() - time_
+            delay = self._start + time_ - _monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return True
+
+    def read(self, size=-1):
+        if not self._data and not self._next_chunk():
+            return self._empty
+        if size is None or size < 0:
+            size = len(self._data)
+        data, self._data = self._data[:size], self._data[size:]
+        return data
+
+    def readline(self, size=-1):
+        if not self._data and not self._next_chunk():
+            return self._empty
+        end = self._data.find(self._newline) + 1 or len(self._data)
+        if size is not None and 0 <= size < end:
+            end = size
+        data, self._data = self._data[:end], self._data[end:]
+        return data
+
+
+class _ReplayOutput(object):
+    """
+    Checks that parser writes the recorded output.
+    """
+
+    def __init__(self, records):
+        self._expected = (b'' if _binary(records) else '').join(
+            _data(record)
+            for record in records if record['direction'] == OUTPUT
+        )
+        self._pos = 0
+
+    def write(self, data):
+        end = self._pos + len(data)
+        expected = self._expected[self._pos:end]
+        if data != expected:
+            raise errors.ReplayMismatchError(
+                "Reply differs from recording at %d: %r != %r" % (
+                    self._pos, data, expected,
+                )
+            )
+        self._pos = end
+
+    def flush(self):
+        pass
+
+    def remaining(self):
+        return self._expected[self._pos:]
+
+
+@base.export
+class Replay(object):
+    """
+    Replays recorded session into parser and checks its replies.
+    """
+
+    def __init__(self, records, pace=False):
+        """
+        Keyword arguments:
+        records -- records returned by load()
+        pace -- replay input at its original pace, otherwise as fast as
+            possible
+        """
+        self.input_ = _ReplayInput(records, pace)
+        self.output = _ReplayOutput(records)
+
+    def attach(self, parser):
+        """
+        Sets streams of parser to replayed ones.
+
+        :param parser: instance of MachineDialogParser
+        """
+        parser.set_streams(self.input_, self.output)
+
+    def verify(self):
+        """
+        Checks that all recorded output was written.
+        """
+        remaining = self.output.remaining()
+        if remaining:
+            raise errors.ReplayMismatchError(
+                "Recorded output wasn't written: %r" % remaining
+            )
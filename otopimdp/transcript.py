@@ -0,0 +1,208 @@
+#
+# otopi -- plugable installer
+# Copyright (C) 2012-2014 Red Hat, Inc.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+
+"""
+Module implements offline reader of archived machine dialog transcripts.
+"""
+
+
+import os
+import json
+import mmap
+from otopimdp import base
+from otopimdp import constants as c
+from otopimdp import errors
+from otopimdp.parser import MachineDialogParser
+
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+
+class _MappedInput(object):
+    """
+    Input of parser reading lines of memory mapped transcript, every
+    chunk is single line so position of next event is always known.
+    """
+
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def readline(self, size=-1):
+        start = self.offset
+        if start >= len(self.data):
+            return b''
+        end = self.data.find(b'\n', start)
+        end = len(self.data) if end < 0 else end + 1
+        self.offset = end
+        return self.data[start:end]
+
+
+@base.export
+class TranscriptReader(object):
+    """
+    Reads events of transcript file by offsets stored in index.
+
+    The index contains offset, type and name of every event, it is
+    stored next to transcript (path + INDEX_SUFFIX) and rebuilt when
+    the transcript changes. Incomplete event at the end of transcript
+    isn't indexed.
+    """
+
+    def __init__(self, path, index_path=None, encoding='utf-8',
+                 errors='replace'):
+        """
+        Keyword arguments:
+        path -- path to transcript
+        index_path -- path to index, by default path + INDEX_SUFFIX
+        encoding -- encoding of transcript
+        errors -- error policy of decoding
+        """
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self.encoding = encoding
+        self.errors = errors
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._stamp = [stat.st_size, stat.st_mtime]
+        if stat.st_size:
+            self._data = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ,
+            )
+        else:
+            self._data = b''
+        self._offsets = []
+        self._types = []
+        self._names = []
+        if not self._load_index():
+            self._build_index()
+            self._save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _parser(self, offset):
+        # only values of read events are decoded
+        return MachineDialogParser(
+            _MappedInput(self._data, offset),
+            encoding=self.encoding, errors=self.errors,
+        )
+
+    def _build_index(self):
+        parser = self._parser(0)
+        input_ = parser.input_
+        while input_.offset < len(self._data):
+            offset = input_.offset
+            try:
+                event = parser.next_event()
+            except errors.UnexpectedEOF:
+                # transcript of killed installer ends inside multi-line
+                # event, the complete events before it are indexed
+                break
+            if event is None:
+                continue
+            attributes = event[c.ATTRIBUTES_KEY]
+            self._offsets.append(offset)
+            self._types.append(event[c.TYPE_KEY])
+            self._names.append(attributes.get('name', attributes.get('what')))
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as stream:
+                index = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return False
+        if index.get('version') != INDEX_VERSION or (
+            index.get('stamp') != self._stamp
+        ):
+            return False
+        types = index['types']
+        names = index['names']
+        self._offsets = index['offsets']
+        self._types = [types[i] for i in index['event_types']]
+        self._names = [
+            None if i < 0 else names[i] for i in index['event_names']
+        ]
+        return True
+
+    def _save_index(self):
+        types = sorted(set(self._types))
+        names = sorted(set(name for name in self._names if name is not None))
+        type_ids = dict((type_, i) for i, type_ in enumerate(types))
+        name_ids = dict((name, i) for i, name in enumerate(names))
+        index = {
+            'version': INDEX_VERSION,
+            'stamp': self._stamp,
+            'types': types,
+            'names': names,
+            'offsets': self._offsets,
+            'event_types': [type_ids[type_] for type_ in self._types],
+            'event_names': [
+                -1 if name is None else name_ids[name]
+                for name in self._names
+            ],
+        }
+        try:
+            with open(self.index_path, 'w') as stream:
+                json.dump(index, stream, separators=(',', ':'))
+        except (IOError, OSError):
+            # index is only an optimization, e.g. archive can be read-only
+            pass
+
+    def event(self, number):
+        """
+        Returns event of given number.
+
+        :param number: position of event in transcript
+        """
+        return self._parser(self._offsets[number]).next_event()
+
+    def numbers(self, event_type=None, name=None):
+        """
+        Returns numbers of events with given type and name, None matches
+        any type or name.
+        """
+        return [
+            number for number, (type_, name_) in enumerate(
+                zip(self._types, self._names)
+            )
+            if (event_type is None or type_ == event_type) and
+            (name is None or name_ == name)
+        ]
+
+    def find(self, event_type=None, name=None):
+        """
+        Yields events with given type and name (or what of confirm),
+        None matches any type or name.
+        """
+        for number in self.numbers(event_type, name):
+            yield self.event(number)
@@ -23,34 +23,122 @@ Module contains set of helpers used in this library.
 """
 
 
+import collections
+
+
+# placeholders of escaped backslash and separator of QValidValues options
+_ESCAPED_BACKSLASH = '\x00'
+_ESCAPED_SEPARATOR = '\x01'
+
+
 def split_valid_options(string):
     """
     This function is used to unescape and split QValidValues data.
     """
-    voptions = []
-    option = ""
-    last_c = None
-    for c in string:
-        if last_c == '\\':
-            if c == '\\':
-                option += '\\'
-                last_c = None
-            elif c == '|':
-                option += '|'
-                last_c = c
-            else:
-                raise ValueError(
-                    "Unescaped '\\' in the valid options: %s" % string
-                )
-        elif c == '\\':
-            last_c = c
-        elif c == '|':
-            voptions.append(option)
-            option = ""
-            last_c = c
+    if '\\' not in string:
+        options = string.split('|')
+    elif _ESCAPED_BACKSLASH in string or _ESCAPED_SEPARATOR in string:
+        raise ValueError("Invalid character in the valid options: %r" % string)
+    else:
+        # escapes are replaced from left like they are read
+        escaped = string.replace(
+            '\\\\', _ESCAPED_BACKSLASH,
+        ).replace(
+            '\\|', _ESCAPED_SEPARATOR,
+        )
+        if escaped.endswith('\\'):
+            escaped = escaped[:-1]
+        if '\\' in escaped:
+            raise ValueError(
+                "Unescaped '\\' in the valid options: %s" % string
+            )
+        options = [
+            option.replace(
+                _ESCAPED_BACKSLASH, '\\',
+            ).replace(
+                _ESCAPED_SEPARATOR, '|',
+            )
+            for option in escaped.split('|')
+        ]
+    # trailing separator doesn't start new option
+    if not options[-1]:
+        options.pop()
+    return options
+
+
+def valid_options(string):
+    """
+    Returns tuple (list of options, frozenset of options and their lower
+    case forms) of QValidValues data, otopi repeats the same frames, so
+    results are memoized. The list is copy owned by caller.
+    """
+    parsed = _VALID_OPTIONS_CACHE.get(string)
+    if parsed is LRUCache.MISSING:
+        options = tuple(split_valid_options(string))
+        parsed = (
+            options,
+            frozenset(options).union(option.lower() for option in options),
+        )
+        _VALID_OPTIONS_CACHE.set(string, parsed)
+    return list(parsed[0]), parsed[1]
+
+
+class LRUCache(object):
+    """
+    Dictionary with limited size which evicts least recently used items,
+    it counts hits and misses of get().
+    """
+
+    MISSING = object()
+
+    def __init__(self, size):
+        """
+        Keyword arguments:
+        size -- maximal number of items
+        """
+        if size < 1:
+            raise ValueError("Size of cache must be positive: %s" % size)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=MISSING):
+        """
+        Returns cached value of key or default
+        """
+        value = self._items.pop(key, self.MISSING)
+        if value is self.MISSING:
+            self.misses += 1
+            return default
+        self._items[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Caches value of key, the least recently used item is evicted when
+        the cache is full
+        """
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Removes key from cache, all items are removed when key is None
+        """
+        if key is None:
+            self._items.clear()
         else:
-            option += c
-            last_c = c
-    if option:
-        voptions.append(option)
-    return voptions
+            self._items.pop(key, None)
+
+
+_VALID_OPTIONS_CACHE = LRUCache(256)
@@ -0,0 +1,10 @@
+import sys
+
+
+# tests of modules which need newer python than the oldest supported one
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # async def syntax
+    collect_ignore.append('test_aio.py')
+    # selectors and os.set_blocking
+    collect_ignore.append('test_multiplexer.py')
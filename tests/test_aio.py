@@ -0,0 +1,141 @@
+import sys
+import asyncio
+import pytest
+from otopimdp.aio import AsyncMachineDialogParser
+from otopimdp import constants as c
+from otopimdp import errors as e
+
+
+class FakeWriter(object):
+
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def create_parser(data, limit=2 ** 16):
+    reader = asyncio.StreamReader(limit=limit)
+    reader.feed_data(data.encode('utf-8'))
+    reader.feed_eof()
+    return AsyncMachineDialogParser(reader, FakeWriter())
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+def test_events():
+    data = (
+        "#NOTE\r\n"
+        "***L:INFO %s\n"
+        "***D:VALUE key1=int:52\n"
+        "**%%QStart: MyFrame\n"
+        "**%%QDefault: one\n"
+        "***Q:VALUE value1\n"
+        "**%%QValidValues: one|two\n"
+        "**%%QEnd: MyFrame\n"
+        "***TERMINATE"
+    ) % ("x" * 100)
+
+    async def scenario():
+        parser = create_parser(data, limit=16)
+        event = await parser.next_event()
+        assert event[c.TYPE_KEY] == c.NOTE_EVENT
+        assert event[c.ATTRIBUTES_KEY]['note'] == "NOTE"
+        event = await parser.next_event()
+        assert event[c.TYPE_KEY] == c.LOG_EVENT
+        assert event[c.ATTRIBUTES_KEY]['record'] == "x" * 100
+        event = await parser.next_event()
+        assert event[c.ATTRIBUTES_KEY]['value'] == 52
+        event = await parser.next_event()
+        assert event[c.TYPE_KEY] == c.QUERY_VALUE_EVENT
+        assert event[c.ATTRIBUTES_KEY][c.DEFAULT_KEY] == 'one'
+        assert event[c.ATTRIBUTES_KEY][c.VALID_VALUES_KEY] == ['one', 'two']
+        event[c.REPLY_KEY] = 'two'
+        await parser.send_response(event)
+        event = await parser.next_event()
+        assert event[c.TYPE_KEY] == c.TERMINATE_EVENT
+        with pytest.raises(e.UnexpectedEOF):
+            await parser.next_event()
+        return parser.writer.data
+
+    assert run(scenario()) == b"VALUE value1=str:two\n"
+
+
+def test_cli():
+    data = (
+        "***D:VALUE key1=str:value1\n"
+        "***Q:MULTI-STRING key2 boundary1 boundary2\n"
+        "***D:MULTI-STRING log boundary1\n"
+        "line 1\n"
+        "line 2\n"
+        "boundary1\n"
+        "***D:MULTI-STRING log boundary1\n"
+        "line 1\n"
+        "boundary1\n"
+        "***Q:STRING prompt\n"
+    )
+
+    class Dest(object):
+        lines = []
+
+        def write(self, data):
+            self.lines.append(data)
+
+    async def scenario():
+        parser = create_parser(data)
+        assert await parser.cli_env_get('key1') == 'value1'
+        await parser.cli_env_set('key2', ['line 1'])
+        assert await parser.cli_download_log() == "line 1\nline 2\n"
+        dest = Dest()
+        assert await parser.cli_download_log(dest) is None
+        assert dest.lines == ["line 1\n"]
+        with pytest.raises(e.UnexpectedEventError):
+            await parser.cli_env_get('key3')
+        await parser.cli_install()
+        return parser.writer.data
+
+    assert run(scenario()) == (
+        b"env-get -k key1\n"
+        b"env-query-multi -k key2\n"
+        b"line 1\n"
+        b"boundary1\n"
+        b"log\n"
+        b"log\n"
+        b"env-get -k key3\n"
+        b"install\n"
+    )
+
+
+def test_subprocess():
+    script = (
+        "import sys\n"
+        "print('***Q:STRING prompt')\n"
+        "sys.stdout.flush()\n"
+        "print('#' + sys.stdin.readline().strip())\n"
+        "print('***TERMINATE')\n"
+    )
+
+    async def scenario():
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        parser = AsyncMachineDialogParser(process.stdout, process.stdin)
+        event = await parser.next_event()
+        assert event[c.TYPE_KEY] == c.QUERY_STRING_EVENT
+        event[c.REPLY_KEY] = 'reply'
+        await parser.send_response(event)
+        event = await parser.next_event()
+        assert event[c.ATTRIBUTES_KEY]['note'] == 'reply'
+        event = await parser.next_event()
+        assert event[c.TYPE_KEY] == c.TERMINATE_EVENT
+        return await process.wait()
+
+    assert run(scenario()) == 0
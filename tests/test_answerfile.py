@@ -0,0 +1,126 @@
+import os
+import six
+import pytest
+from otopimdp.answerfile import (
+    parse_answer_file,
+    compile_answers,
+    load_answer_file,
+)
+from otopimdp.parser import MachineDialogParser
+from otopimdp import constants as c
+from otopimdp import errors as e
+
+
+ANSWER_FILE = u"""
+# comment
+[environment:init]
+HOST_NAME=str:ignored
+
+[environment:default]
+HOST_NAME=str:host.example.com
+; comment
+HOST_ID=int:7
+PROCEED=bool:True
+SKIP=bool:false
+GATEWAY=none:None
+"""
+
+
+def test_parse():
+    values = parse_answer_file(ANSWER_FILE.splitlines())
+    assert values == {
+        'HOST_NAME': 'host.example.com',
+        'HOST_ID': 7,
+        'PROCEED': True,
+        'SKIP': False,
+        'GATEWAY': None,
+    }
+    values = parse_answer_file(
+        ANSWER_FILE.splitlines(),
+        sections=('environment:default', 'environment:init'),
+    )
+    assert values['HOST_NAME'] == 'ignored'
+
+
+@pytest.mark.parametrize('line', [
+    'KEY',
+    'KEY=value',
+    'KEY=float:1.0',
+    'KEY=int:x',
+    '[environment:default',
+])
+def test_parse_errors(line):
+    with pytest.raises(e.AnswerFileError) as ex:
+        parse_answer_file(['[environment:default]', line], name='answers')
+    assert 'answers:2' in str(ex.value)
+
+
+def test_compile():
+    table = compile_answers(parse_answer_file(ANSWER_FILE.splitlines()))
+    assert table == {
+        (c.QUERY_VALUE_EVENT, 'HOST_NAME'): 'VALUE HOST_NAME=str:'
+                                            'host.example.com',
+        (c.QUERY_STRING_EVENT, 'HOST_NAME'): 'host.example.com',
+        (c.QUERY_VALUE_EVENT, 'HOST_ID'): 'VALUE HOST_ID=int:7',
+        (c.QUERY_STRING_EVENT, 'HOST_ID'): '7',
+        (c.QUERY_VALUE_EVENT, 'PROCEED'): 'VALUE PROCEED=bool:True',
+        (c.CONFIRM_EVENT, 'PROCEED'): 'CONFIRM PROCEED=yes',
+        (c.QUERY_VALUE_EVENT, 'SKIP'): 'VALUE SKIP=bool:False',
+        (c.CONFIRM_EVENT, 'SKIP'): 'CONFIRM SKIP=no',
+        (c.QUERY_VALUE_EVENT, 'GATEWAY'): 'VALUE GATEWAY=none:None',
+    }
+
+
+def test_load_cached(tmpdir):
+    path = tmpdir.join('answers.conf')
+    path.write_text(ANSWER_FILE, 'utf-8')
+    cache_dir = tmpdir.mkdir('cache')
+
+    table = load_answer_file(str(path), cache_dir=str(cache_dir))
+    assert len(cache_dir.listdir()) == 1
+    cached = load_answer_file(str(path), cache_dir=str(cache_dir))
+    assert cached == table
+    assert cached.values == table.values
+    assert cached == load_answer_file(str(path))
+
+    data = (
+        "***Q:STRING HOST_NAME\n"
+        "***CONFIRM PROCEED Proceed\n"
+        "***Q:VALUE HOST_ID\n"
+        "***TERMINATE\n"
+    )
+    out = six.StringIO()
+    MachineDialogParser(six.StringIO(data), out).run(cached)
+    assert out.getvalue() == (
+        "host.example.com\n"
+        "CONFIRM PROCEED=yes\n"
+        "VALUE HOST_ID=int:7\n"
+    )
+
+    # changed file gets new fingerprint
+    path.write_text(ANSWER_FILE + u"HOST_ID=int:8\n", 'utf-8')
+    table = load_answer_file(str(path), cache_dir=str(cache_dir))
+    assert table[(c.QUERY_VALUE_EVENT, 'HOST_ID')] == 'VALUE HOST_ID=int:8'
+    assert len(cache_dir.listdir()) == 2
+
+    # broken or foreign cache is parsed again
+    for content in (
+        b'broken',
+        b'{}',
+        b'[1]',
+        b'[["unknown", "name", "reply", "reply"]]',
+        b'[["query_string", "name"]]',
+        # entry of previous version
+        b'[["query_string", "name", "reply"]]',
+        b'[["query_string", "name", "reply", 1.5]]',
+        b'\xff',
+        # pickles are never loaded
+        b'cos\nnope\n.',
+        b'(lp0\nI1\na.',
+    ):
+        for cache_file in cache_dir.listdir():
+            cache_file.write(content, 'wb')
+        assert load_answer_file(str(path), cache_dir=str(cache_dir)) == table
+    assert not [
+        name for name in os.listdir(str(cache_dir)) if name.endswith('.tmp')
+    ]
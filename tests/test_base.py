@@ -0,0 +1,43 @@
+import sys
+import logging
+import subprocess
+from otopimdp import base
+from otopimdp import constants as c
+
+
+def test_logger():
+    class Foo(base.Base):
+        pass
+
+    logger = Foo().logger
+    assert isinstance(logger, logging.Logger)
+    assert logger.name == base.LOG_PREFIX + __name__
+
+
+def test_export():
+    from otopimdp import parser
+    assert 'MachineDialogParser' in parser.__all__
+
+
+def test_lazy_regex():
+    regex = c._LazyRegex(r'^a(?P<b>.)$')
+    assert 'match' not in vars(regex)
+    assert regex.match('ab').group('b') == 'b'
+    assert 'match' in vars(regex)
+    assert regex.groupindex['b'] == 1
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, otopimdp\n"
+        "from otopimdp import constants as c\n"
+        "assert 'otopi' not in sys.modules\n"
+        "assert sys.version_info < (3, 7) or 'asyncio' not in sys.modules\n"
+        "assert sys.version_info < (3, 7) or ("
+        "'multiprocessing' not in sys.modules)\n"
+        "assert sys.version_info < (3, 7) or ("
+        "'otopimdp.answerfile' not in sys.modules)\n"
+        "assert not any("
+        "'match' in vars(t[c.REGEX_KEY]) for t in c.TRANSLATION)\n"
+    )
+    subprocess.check_call([sys.executable, '-c', code])
@@ -0,0 +1,17 @@
+import six
+from otopimdp import constants as c
+from otopimdp.parser import MachineDialogParser
+from benchmarks import transcript
+from benchmarks.run import drive
+
+
+def test_transcript_is_parsed():
+    data = transcript.generate(events=500, long_line_length=100)
+    out = six.StringIO()
+    parser = MachineDialogParser(six.StringIO(data), out)
+    stats = drive(parser)
+    assert 'unmatched' not in stats
+    assert sum(count for count, _ in stats.values()) > 1
+    assert stats[c.TERMINATE_EVENT][0] == 1
+    assert stats[c.LOG_EVENT][0] > stats[c.NOTE_EVENT][0]
+    assert out.getvalue()
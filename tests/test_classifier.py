@@ -0,0 +1,54 @@
+import re
+import pytest
+from otopimdp import constants as c
+from otopimdp.classifier import EventClassifier, DEFAULT_CLASSIFIER
+
+
+DATA = [
+    ('#NOTE', c.NOTE_EVENT),
+    ('***L:INFO record', c.LOG_EVENT),
+    ('***TERMINATE', c.TERMINATE_EVENT),
+    ('**%QStart: MyFrame', c.QUERY_FRAME_EVENT),
+    ('***Q:STRING str1', c.QUERY_STRING_EVENT),
+    ('***Q:MULTI-STRING mstr1 b1 b2', c.QUERY_MULTI_STRING_EVENT),
+    ('***Q:VALUE value1', c.QUERY_VALUE_EVENT),
+    ('***CONFIRM what description', c.CONFIRM_EVENT),
+    ('***D:VALUE key=str:value', c.DISPLAY_VALUE_EVENT),
+    ('***D:MULTI-STRING key boundary', c.DISPLAY_MULTI_STRING_EVENT),
+]
+
+
+@pytest.mark.parametrize("line,event_type", DATA)
+def test_classify(line, event_type):
+    type_, match = DEFAULT_CLASSIFIER.classify(line)
+    assert type_ == event_type
+    assert match.re.match(line)
+
+
+@pytest.mark.parametrize("line", [
+    '',
+    'XXX',
+    '***Q:STRING1 hello',
+    '***Q:MUTLI-STRING hello',
+    '***L:INFO',
+    '**%QEnd: MyFrame',
+])
+def test_no_match(line):
+    assert DEFAULT_CLASSIFIER.classify(line) is None
+
+
+def test_ambiguous_prefixes():
+    translation = (
+        {
+            c.TYPE_KEY: c.LOG_EVENT,
+            c.PREFIX_KEY: '***L:',
+            c.REGEX_KEY: re.compile(r'^.*$'),
+        },
+        {
+            c.TYPE_KEY: c.NOTE_EVENT,
+            c.PREFIX_KEY: '***',
+            c.REGEX_KEY: re.compile(r'^.*$'),
+        },
+    )
+    with pytest.raises(ValueError):
+        EventClassifier(translation)
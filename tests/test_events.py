@@ -0,0 +1,91 @@
+import sys
+import pickle
+import pytest
+from otopimdp import constants as c
+from otopimdp.classifier import DEFAULT_CLASSIFIER
+from otopimdp.events import (
+    EVENT_CLASSES,
+    DisplayValueEvent,
+    QueryValueEvent,
+    QueryFrameEvent,
+)
+
+
+def test_event_classes():
+    for event_type, event_class in EVENT_CLASSES.items():
+        event = event_class({})
+        assert event[c.TYPE_KEY] == event_type
+        assert not hasattr(event, '__dict__')
+
+
+def test_dict_access():
+    event = QueryValueEvent({'name': 'value1'})
+    assert event[c.ATTRIBUTES_KEY] == {'name': 'value1'}
+    assert c.REPLY_KEY not in event
+    assert event.get(c.REPLY_KEY) is None
+    assert event.get(c.ABORT_KEY, False) is False
+    with pytest.raises(KeyError):
+        event[c.REPLY_KEY]
+    with pytest.raises(KeyError):
+        event['unknown']
+
+    event[c.REPLY_KEY] = 'reply'
+    event[c.ABORT_KEY] = True
+    assert event[c.REPLY_KEY] == 'reply'
+    assert event.get(c.ABORT_KEY, False) is True
+    assert c.REPLY_KEY in event
+    assert repr(event).startswith('QueryValueEvent(')
+
+    with pytest.raises(KeyError):
+        event[c.TYPE_KEY] = c.NOTE_EVENT
+
+
+def test_event_is_smaller_than_dict():
+    attributes = {'name': 'value1'}
+    event = QueryValueEvent(attributes)
+    legacy = {c.TYPE_KEY: c.QUERY_VALUE_EVENT, c.ATTRIBUTES_KEY: attributes}
+    assert sys.getsizeof(event) < sys.getsizeof(legacy)
+
+
+def test_frame_event():
+    assert QueryFrameEvent({}).query is None
+
+
+def test_lazy_attributes():
+    line = '***D:VALUE key1=int:52'
+    event = DisplayValueEvent(match=DEFAULT_CLASSIFIER.classify(line)[1])
+    assert event._attributes is None
+    assert event[c.TYPE_KEY] == c.DISPLAY_VALUE_EVENT
+    assert event._attributes is None
+    assert event[c.ATTRIBUTES_KEY]['value'] == 52
+    assert event._match is None
+
+
+@pytest.mark.parametrize("value_type,value,expected", [
+    ('none', 'None', None),
+    ('NONE', 'None', None),
+    ('str', 'value 2', 'value 2'),
+    ('int', '47', 47),
+    ('bool', 'True', True),
+    ('bool', 'false', False),
+])
+def test_display_value_types(value_type, value, expected):
+    line = '***D:VALUE key=%s:%s' % (value_type, value)
+    event = DisplayValueEvent(match=DEFAULT_CLASSIFIER.classify(line)[1])
+    assert event.attributes['value'] == expected
+
+
+def test_unknown_display_value_type():
+    line = '***D:VALUE key=float:1.0'
+    with pytest.raises(TypeError):
+        DisplayValueEvent(match=DEFAULT_CLASSIFIER.classify(line)[1])
+
+
+def test_pickle():
+    line = '***Q:VALUE value1'
+    event = QueryValueEvent(match=DEFAULT_CLASSIFIER.classify(line)[1])
+    event[c.REPLY_KEY] = 47
+    copy = pickle.loads(pickle.dumps(event))
+    assert copy[c.ATTRIBUTES_KEY] == {'name': 'value1'}
+    assert copy[c.REPLY_KEY] == 47
+    assert c.ABORT_KEY not in copy
@@ -0,0 +1,140 @@
+import sys
+import threading
+import pytest
+from otopimdp.fleet import FleetRunner, Job, run_job
+from otopimdp import constants as c
+
+
+INSTALLER = r'''
+import os
+import sys
+
+
+def ask(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+    return sys.stdin.readline().rstrip("\n")
+
+
+host = ask("***Q:STRING HOST_NAME")
+sys.stdout.write("#deploying %s\n" % host)
+if os.environ.get("FAIL_LOG"):
+    sys.stdout.write("***L:ERROR cannot reach %s\n" % host)
+ask("***CONFIRM PROCEED Proceed with deployment")
+ask("***Q:VALUE OPTIONAL")
+command = ask("***TERMINATE")
+if command == "log":
+    sys.stdout.write("***D:MULTI-STRING LOG --=EOF=--\n")
+    sys.stdout.write("deployed %s\n--=EOF=--\n" % host)
+    sys.stdout.flush()
+    command = sys.stdin.readline().rstrip("\n")
+assert command == "quit", command
+sys.exit(int(os.environ.get("EXIT_STATUS", "0")))
+'''
+
+ANSWERS = {
+    (c.QUERY_STRING_EVENT, 'HOST_NAME'): 'host',
+    (c.CONFIRM_EVENT, 'PROCEED'): True,
+    (c.QUERY_VALUE_EVENT, 'OPTIONAL'): 'value',
+}
+
+
+@pytest.fixture
+def command(tmpdir):
+    script = tmpdir.join('installer.py')
+    script.write(INSTALLER)
+    return [sys.executable, str(script)]
+
+
+def test_run_job(command):
+    result = run_job(Job('host1', command, answers=ANSWERS))
+    assert result.ok
+    assert result.returncode == 0
+    assert result.log == 'deployed host\n'
+    assert result.duration > 0
+
+
+def test_run_job_failures(command):
+    answers = dict(ANSWERS)
+    del answers[(c.QUERY_VALUE_EVENT, 'OPTIONAL')]
+    job = Job(
+        'host1', command, answers=answers, download_log=False,
+        env={'FAIL_LOG': '1', 'EXIT_STATUS': '3'},
+    )
+    result = run_job(job)
+    assert not result.ok
+    assert result.error is None
+    assert result.returncode == 3
+    assert result.log is None
+    log, query = result.failed_events
+    assert log[c.ATTRIBUTES_KEY]['record'] == 'cannot reach host'
+    assert query[c.TYPE_KEY] == c.QUERY_VALUE_EVENT
+    assert query[c.ABORT_KEY]
+
+
+def test_run_job_unanswered_string(command):
+    answers = dict(ANSWERS)
+    del answers[(c.QUERY_STRING_EVENT, 'HOST_NAME')]
+    result = run_job(Job('host1', command, answers=answers))
+    assert not result.ok
+    assert result.returncode != 0
+    query, = result.failed_events
+    assert query[c.TYPE_KEY] == c.QUERY_STRING_EVENT
+    assert query[c.ATTRIBUTES_KEY]['name'] == 'HOST_NAME'
+    assert "HOST_NAME can't be aborted" in result.error
+
+
+def test_run_job_error(command, tmpdir):
+    result = run_job(Job('host1', [str(tmpdir.join('missing'))]))
+    assert result.returncode is None
+    assert result.error is not None
+
+    # installer exits without TERMINATE
+    result = run_job(Job('host2', [sys.executable, '-c', '']))
+    assert result.returncode == 0
+    assert 'UnexpectedEOF' in result.error
+    assert not result.ok
+
+
+def test_fleet_priority(command):
+    finished = []
+    runner = FleetRunner(
+        concurrency=1, on_result=lambda r: finished.append(r.host),
+    )
+    runner.submit(Job('low', command, answers=ANSWERS, priority=10))
+    runner.submit(Job('first', command, answers=ANSWERS, priority=0))
+    assert len(runner) == 2
+    results = runner.run([
+        Job('second', command, answers=ANSWERS, priority=0,
+            env={'EXIT_STATUS': '1'}),
+    ])
+    assert len(runner) == 0
+    assert finished == ['first', 'second', 'low']
+    assert results['first'].ok
+    assert results['second'].returncode == 1
+    assert results['low'].log == 'deployed host\n'
+
+
+def test_fleet_concurrency(command):
+    jobs = [
+        Job('host%d' % i, command, answers=ANSWERS) for i in range(6)
+    ]
+    results = FleetRunner(concurrency=3).run(jobs)
+    assert sorted(results) == ['host%d' % i for i in range(6)]
+    assert all(result.ok for result in results.values())
+    assert FleetRunner().run() == {}
+    with pytest.raises(ValueError):
+        FleetRunner(concurrency=0)
+
+
+def test_fleet_job_error(command):
+    job = Job('broken', command, answers=ANSWERS)
+    # job can't be passed to pool
+    job.lock = threading.Lock()
+    results = FleetRunner(concurrency=1).run([
+        job, Job('host1', command, answers=ANSWERS),
+    ])
+    assert not results['broken'].ok
+    assert results['broken'].returncode is None
+    assert 'pickle' in results['broken'].error
+    assert results['host1'].ok
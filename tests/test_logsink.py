@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import six
+import pytest
+from otopimdp.logsink import RingLogSink, FileLogSink
+from otopimdp.parser import MachineDialogParser
+from otopimdp.protocol import DialogProtocol
+from otopimdp import constants as c
+
+
+DATA = (
+    u"***L:INFO record 1\n"
+    u"***D:MULTI-STRING key boundary\n"
+    u"***L:INFO not a record\n"
+    u"boundary\n"
+    u"***L:ERROR record č\n"
+    u"***L:broken\n"
+    u"***Q:STRING str1\n"
+    u"***L:DEBUG record 3\n"
+    u"***TERMINATE\n"
+)
+
+
+def test_ring():
+    sink = RingLogSink(2)
+    assert sink.records() == []
+    sink('INFO', 'a')
+    assert sink.records() == [('INFO', 'a')]
+    sink('INFO', 'b')
+    sink('ERROR', 'c')
+    assert len(sink) == 2
+    assert sink.count == 3
+    assert sink.records() == [('INFO', 'b'), ('ERROR', 'c')]
+    assert sink.format() == "INFO b\nERROR c\n"
+    sink.clear()
+    assert sink.records() == []
+    with pytest.raises(ValueError):
+        RingLogSink(0)
+
+
+def test_file_batches():
+    out = six.StringIO()
+    sink = FileLogSink(out, batch_size=2)
+    sink('INFO', 'a')
+    assert out.getvalue() == ""
+    sink('INFO', 'b')
+    assert out.getvalue() == "INFO a\nINFO b\n"
+    sink('ERROR', 'c')
+    sink.flush()
+    assert out.getvalue() == "INFO a\nINFO b\nERROR c\n"
+    sink.close()
+    assert not out.closed
+
+
+def test_file_path(tmpdir):
+    path = tmpdir.join('otopi.log')
+    with FileLogSink(str(path)) as sink:
+        sink('INFO', u'record č')
+    with FileLogSink(str(path)) as sink:
+        sink('ERROR', 'appended')
+    assert path.read_text('utf-8') == u"INFO record č\nERROR appended\n"
+
+
+@pytest.mark.parametrize("encoding", [None, 'utf-8'])
+def test_protocol_sink(encoding):
+    data = DATA if encoding is None else DATA.encode(encoding)
+    for split in range(len(data) + 1):
+        sink = RingLogSink(2)
+        protocol = DialogProtocol(encoding)
+        protocol.log_sink = sink
+        events = protocol.feed(data[:split])
+        events += protocol.feed(data[split:])
+        events += protocol.feed(data[:0])
+        assert [event[c.TYPE_KEY] for event in events] == [
+            c.DISPLAY_MULTI_STRING_EVENT,
+            c.QUERY_STRING_EVENT,
+            c.TERMINATE_EVENT,
+        ]
+        assert events[0][c.ATTRIBUTES_KEY]['value'] == [
+            u"***L:INFO not a record",
+        ]
+        assert sink.count == 3
+        assert sink.records() == [
+            (u'ERROR', u'record č'), (u'DEBUG', u'record 3'),
+        ]
+
+
+def test_parser_sink():
+    out = six.StringIO()
+    sink = FileLogSink(out)
+    parser = MachineDialogParser(
+        six.StringIO(DATA), six.StringIO(), log_sink=sink,
+        subscribed=[c.QUERY_STRING_EVENT, c.TERMINATE_EVENT],
+    )
+    # the broken LOG line doesn't match any event
+    assert parser.next_event() is None
+    event = parser.next_event()
+    assert event[c.TYPE_KEY] == c.QUERY_STRING_EVENT
+    event = parser.next_event()
+    assert event[c.TYPE_KEY] == c.TERMINATE_EVENT
+    sink.flush()
+    assert out.getvalue() == (
+        u"INFO record 1\nERROR record č\nDEBUG record 3\n"
+    )
+    assert parser.protocol.skipped == 1
@@ -0,0 +1,127 @@
+import six
+import pytest
+from otopimdp.parser import MachineDialogParser
+from otopimdp.metrics import Metrics, Histogram
+from otopimdp import metrics as m
+from otopimdp import constants as c
+
+
+DATA = (
+    "***L:INFO log record\r\n"
+    "garbage\n"
+    "***Q:STRING str1\n"
+    "**%QStart: MyFrame\n"
+    "***Q:VALUE value1\n"
+    "**%QEnd: MyFrame\n"
+    "***D:MULTI-STRING name --=451b80dc-996f-432e-9e4f-2b29ef6d1141=--\n"
+    "line\n"
+    "--=451b80dc-996f-432e-9e4f-2b29ef6d1141=--\n"
+    "***TERMINATE\n"
+)
+
+
+def drive(parser):
+    while True:
+        event = parser.next_event()
+        if event is None:
+            continue
+        if event[c.TYPE_KEY] == c.TERMINATE_EVENT:
+            return
+        if event[c.TYPE_KEY] in (c.QUERY_STRING_EVENT, c.QUERY_VALUE_EVENT):
+            event[c.REPLY_KEY] = 'value'
+            parser.send_response(event)
+
+
+@pytest.mark.parametrize("buffer_size", [0, 4, 8192])
+def test_session_metrics(buffer_size):
+    metrics = Metrics()
+    parser = MachineDialogParser(
+        six.StringIO(DATA), six.StringIO(), buffer_size=buffer_size,
+        metrics=metrics,
+    )
+    drive(parser)
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {
+        m.BYTES_READ: len(DATA),
+        m.LINES_READ: 10,
+        m.UNMATCHED_LINES: 1,
+        m.SKIPPED_EVENTS: 0,
+        m.REPLIES_SENT: 2,
+    }
+    assert snapshot[m.EVENTS] == {
+        c.LOG_EVENT: 1,
+        c.QUERY_STRING_EVENT: 1,
+        c.QUERY_VALUE_EVENT: 1,
+        c.DISPLAY_MULTI_STRING_EVENT: 1,
+        c.TERMINATE_EVENT: 1,
+    }
+    histograms = snapshot['histograms']
+    assert histograms[m.PARSE_TIME]['count'] == 5
+    assert histograms[m.REPLY_DELAY]['count'] == 2
+    assert histograms[m.READ_WAIT]['count'] > 0
+
+
+def test_skipped_events_are_counted():
+    metrics = Metrics()
+    parser = MachineDialogParser(
+        six.StringIO(DATA), six.StringIO(), metrics=metrics,
+        subscribed=[c.QUERY_STRING_EVENT, c.TERMINATE_EVENT],
+    )
+    drive(parser)
+    counters = metrics.snapshot()['counters']
+    # LOG, framed QUERY_VALUE and DISPLAY_MULTI_STRING
+    assert counters[m.SKIPPED_EVENTS] == 3
+    assert counters[m.LINES_READ] == 10
+    assert counters[m.REPLIES_SENT] == 1
+    assert parser.protocol.skipped == 3
+    assert metrics.events == {
+        c.QUERY_STRING_EVENT: 1,
+        c.TERMINATE_EVENT: 1,
+    }
+
+
+def test_sink():
+    samples = []
+    metrics = Metrics(sink=lambda name, value: samples.append(name))
+    parser = MachineDialogParser(
+        six.StringIO(DATA), six.StringIO(), metrics=metrics,
+    )
+    drive(parser)
+    assert samples.count('%s.%s' % (m.EVENTS, c.QUERY_VALUE_EVENT)) == 1
+    assert samples.count(m.REPLIES_SENT) == 2
+    assert samples.count(m.REPLY_DELAY) == 2
+    assert samples.count(m.UNMATCHED_LINES) == 1
+
+
+def test_reply_delay_needs_returned_query():
+    metrics = Metrics()
+    parser = MachineDialogParser(
+        six.StringIO("***Q:VALUE key\n"), six.StringIO(), metrics=metrics,
+    )
+    parser.cli_env_set_many([('key', 'value')])
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'][m.REPLIES_SENT] == 1
+    assert snapshot['histograms'][m.REPLY_DELAY]['count'] == 0
+
+
+def test_histogram():
+    histogram = Histogram()
+    for value in (0, 1e-6, 1.5e-6, 1000):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 4
+    assert snapshot['min'] == 0
+    assert snapshot['max'] == 1000
+    assert snapshot['buckets'] == [[1e-6, 2], [2e-6, 1], [None, 1]]
+
+
+def test_reset():
+    metrics = Metrics()
+    metrics.count(m.LINES_READ)
+    metrics.count_event(c.LOG_EVENT)
+    metrics.observe(m.PARSE_TIME, 1)
+    metrics.reset()
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'][m.LINES_READ] == 0
+    assert snapshot[m.EVENTS] == {}
+    assert snapshot['histograms'][m.PARSE_TIME]['count'] == 0
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import os
+import six
+import pytest
+from otopimdp.parser import MachineDialogParser
+from otopimdp.multiplexer import SessionMultiplexer
+from otopimdp import constants as c
+from otopimdp import errors as e
+
+
+class Installer(object):
+
+    def __init__(self, encoding=None):
+        read_fd, self.write_fd = os.pipe()
+        if encoding is None:
+            self.input_ = os.fdopen(read_fd, 'r')
+            self.output = six.StringIO()
+        else:
+            self.input_ = os.fdopen(read_fd, 'rb')
+            self.output = six.BytesIO()
+        self.parser = MachineDialogParser(
+            self.input_, self.output, encoding=encoding,
+        )
+        self.events = []
+
+    def handler(self, parser, event):
+        assert parser is self.parser
+        self.events.append(event)
+        if event[c.TYPE_KEY] == c.QUERY_STRING_EVENT:
+            event[c.REPLY_KEY] = 'reply'
+            parser.send_response(event)
+
+    def send(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        os.write(self.write_fd, data)
+
+    def close(self):
+        os.close(self.write_fd)
+
+
+@pytest.fixture
+def installers():
+    installers = [Installer(), Installer()]
+    yield installers
+    for installer in installers:
+        installer.input_.close()
+
+
+def test_sessions_dont_block_each_other(installers):
+    first, second = installers
+    mux = SessionMultiplexer()
+    for installer in installers:
+        mux.register(installer.parser, installer.handler)
+    assert len(mux) == 2
+
+    # incomplete frame of first installer
+    first.send("**%QStart: MyFrame\n***Q:STRING str1\n**%QEnd:")
+    second.send("#NOTE\n***D:MULTI-STRING key boundary\nline 1\n")
+    assert mux.poll(1) == 1
+    assert first.events == []
+    assert second.events[0][c.ATTRIBUTES_KEY]['note'] == 'NOTE'
+
+    first.send(" MyFrame\n***TERMINATE\n")
+    # split multi-byte character
+    second.send(b"line \xc4")
+    assert mux.poll(1) == 2
+    assert first.events[0][c.ATTRIBUTES_KEY]['name'] == 'str1'
+    assert first.events[0][c.ATTRIBUTES_KEY][c.FRAME_NAME_KEY] == 'MyFrame'
+    assert first.events[1][c.TYPE_KEY] == c.TERMINATE_EVENT
+    assert first.output.getvalue() == "reply\n"
+
+    second.send(b"\x8d\nboundary\n")
+    first.close()
+    second.close()
+    mux.run()
+    assert len(mux) == 0
+    assert second.events[1][c.ATTRIBUTES_KEY]['value'] == [
+        'line 1', u'line č',
+    ]
+    assert second.parser.input_ is second.input_
+
+
+def test_bytes_mode():
+    installer = Installer(encoding='utf-8')
+    mux = SessionMultiplexer()
+    mux.register(installer.parser, installer.handler)
+    try:
+        installer.send(b"***Q:STRING str1\n***D:MULTI-STRING key b\nline \xc4")
+        assert mux.poll(1) == 1
+        assert installer.output.getvalue() == b"reply\n"
+        installer.send(b"\x8d\nb\n")
+        installer.close()
+        mux.run()
+        assert installer.events[1][c.ATTRIBUTES_KEY]['value'] == [u'line č']
+    finally:
+        installer.input_.close()
+
+
+def test_truncated_event(installers):
+    installer = installers[0]
+    failed = []
+    mux = SessionMultiplexer()
+    mux.register(
+        installer.parser, installer.handler,
+        on_error=lambda parser, error: failed.append((parser, error)),
+    )
+    installer.send("***D:MULTI-STRING key boundary\nline 1\n")
+    installer.close()
+    mux.run()
+    assert len(mux) == 0
+    (parser, error), = failed
+    assert parser is installer.parser
+    assert isinstance(error, e.UnexpectedEOF)
+
+
+def test_failed_session_doesnt_stop_others():
+    installers = [Installer() for _ in range(3)]
+    failed = {}
+
+    def on_error(parser, error):
+        failed[parser] = error
+
+    def broken_handler(parser, event):
+        raise RuntimeError("handler failed")
+
+    bad_input, bad_handler, good = installers
+    mux = SessionMultiplexer()
+    mux.register(bad_input.parser, bad_input.handler, on_error=on_error)
+    mux.register(bad_handler.parser, broken_handler, on_error=on_error)
+    mux.register(good.parser, good.handler, on_error=on_error)
+    try:
+        bad_input.send("**%QStart: MyFrame\n**%QUnknown: value\n")
+        bad_handler.send("#NOTE\n")
+        good.send("#NOTE\n")
+        mux.poll(1)
+        mux.poll(0)
+        assert len(mux) == 1
+        assert isinstance(failed[bad_input.parser], e.UnexpectedInputError)
+        assert str(failed[bad_handler.parser]) == "handler failed"
+        for installer in (bad_input, bad_handler):
+            assert installer.parser.input_ is installer.input_
+            assert os.get_blocking(installer.input_.fileno())
+
+        good.send("***TERMINATE\n")
+        good.close()
+        mux.run()
+        assert good.parser not in failed
+        assert [event[c.TYPE_KEY] for event in good.events] == [
+            c.NOTE_EVENT, c.TERMINATE_EVENT,
+        ]
+    finally:
+        for installer in installers:
+            if installer is not good:
+                installer.close()
+            installer.input_.close()
+
+
+@pytest.mark.parametrize("encoding", [None, 'utf-8'])
+def test_unbuffered_parser(encoding):
+    installer = Installer(encoding=encoding)
+    installer.parser.buffer_size = 0
+    mux = SessionMultiplexer()
+    mux.register(installer.parser, installer.handler)
+    try:
+        installer.send("#a\n#b")
+        installer.close()
+        mux.run()
+        assert [
+            event[c.ATTRIBUTES_KEY]['note'] for event in installer.events
+        ] == ['a', 'b']
+    finally:
+        installer.input_.close()
+
+
+def test_streamed_parser_is_refused(installers):
+    installer = installers[0]
+    installer.parser.stream_multi_string = True
+    with pytest.raises(ValueError):
+        SessionMultiplexer().register(installer.parser, installer.handler)
+
+
+@pytest.mark.parametrize("encoding", [None, 'utf-8'])
+def test_unregistered_parser_continues(encoding):
+    installer = Installer(encoding=encoding)
+    mux = SessionMultiplexer()
+    mux.register(installer.parser, installer.handler)
+    try:
+        installer.send(b"***Q:STRING str1\n***D:MULTI-STRING key b\nline \xc4")
+        assert mux.poll(1) == 1
+        # rest of split character is read by unregister
+        installer.send(b"\x8d")
+        mux.unregister(installer.parser)
+        assert len(mux) == 0
+        assert os.get_blocking(installer.input_.fileno())
+        assert installer.parser.input_ is installer.input_
+
+        # writer is still open, incomplete event continues
+        installer.send(b"\nb\n")
+        event = installer.parser.next_event()
+        assert event[c.ATTRIBUTES_KEY]['value'] == [u'line č']
+        installer.send(b"***TERMINATE\n")
+        event = installer.parser.next_event()
+        assert event[c.TYPE_KEY] == c.TERMINATE_EVENT
+    finally:
+        installer.close()
+        installer.input_.close()
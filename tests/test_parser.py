@@ -18,12 +18,14 @@
 #
 
 
+import os
 import sys
 import logging
 import unittest
 import six
 import pytest
-from otopimdp.parser import MachineDialogParser
+from otopimdp.parser import MachineDialogParser, AnswerTable
+from otopimdp.recorder import Recorder
 from otopimdp import constants as c
 from otopimdp import errors as e
 
@@ -356,6 +358,41 @@ class MachineDialogParserTest(unittest.TestCase):
         event = parser.next_event()
         assert event[c.ATTRIBUTES_KEY][c.FRAME_NAME_KEY] == "MyFrame"
 
+    def test_reply_not_in_valid_values(self):
+        data = (
+            "**%QStart: MyFrame\n"
+            "**%QValidValues: Yes|No\n"
+            "***Q:STRING str1\n"
+            "**%QEnd: MyFrame\n"
+            "**%QStart: MyFrame\n"
+            "**%QValidValues: 1|2\n"
+            "***Q:VALUE value1\n"
+            "**%QEnd: MyFrame\n"
+        )
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+
+        event = parser.next_event()
+        self.assertEqual(
+            event[c.ATTRIBUTES_KEY][c.VALID_VALUES_SET_KEY],
+            frozenset(['Yes', 'No', 'yes', 'no']),
+        )
+        event[c.REPLY_KEY] = "maybe"
+        with pytest.raises(e.InvalidReplyError):
+            parser.send_response(event)
+        event[c.REPLY_KEY] = "yes"
+        parser.send_response(event)
+
+        event = parser.next_event()
+        event[c.REPLY_KEY] = 3
+        with pytest.raises(e.InvalidReplyError):
+            parser.send_response(event)
+        event[c.REPLY_KEY] = 2
+        parser.send_response(event)
+
+        self._compare_outputs(out, "yes\nVALUE value1=int:2\n")
+
     def test_invalid_hiden_attribute_in_qframe(self):
         data = (
             "**%QStart: MyFrame\n"
@@ -670,5 +707,630 @@ class MachineDialogParserTest(unittest.TestCase):
 
         self._compare_outputs(out, expected_output)
 
+    def test_long_line_over_buffer_size(self):
+        record = "x" * 1000
+        data = "***L:INFO %s\r\n#NOTE" % record
+        parser = self.create_parser(data)
+        parser.buffer_size = 7
+
+        event = parser.next_event()
+        self._expect_log(event, record, 'INFO')
+        event = parser.next_event()
+        self._expect_note(event, "NOTE")
+        with pytest.raises(e.UnexpectedEOF):
+            parser.next_line()
+
+    def test_unbuffered_reading(self):
+        data = (
+            "#NOTE\r\n"
+            "***L:INFO record\n"
+            "***TERMINATE"
+        )
+        parser = self.create_parser(data)
+        parser.buffer_size = 0
+
+        self._expect_note(parser.next_event(), "NOTE")
+        self._expect_log(parser.next_event(), "record", 'INFO')
+        self._expect_terminate(parser.next_event())
+        with pytest.raises(e.UnexpectedEOF):
+            parser.next_line()
+
+    def test_return_character_before_eof(self):
+        parser = self.create_parser("#NOTE\n\r")
+
+        self._expect_note(parser.next_event(), "NOTE")
+        with pytest.raises(e.UnexpectedEOF):
+            parser.next_line()
+
+    def test_reading_from_pipe(self):
+        read_fd, write_fd = os.pipe()
+        input_ = os.fdopen(read_fd, 'r')
+        writer = os.fdopen(write_fd, 'w')
+        parser = MachineDialogParser(input_, six.StringIO())
+        try:
+            # parser must not wait for more data than a single line
+            writer.write("***Q:STRING prompt\n")
+            writer.flush()
+            self._expect_qstring(parser.next_event(), 'prompt')
+            writer.write("***TERMINATE\n")
+            writer.close()
+            self._expect_terminate(parser.next_event())
+            with pytest.raises(e.UnexpectedEOF):
+                parser.next_line()
+        finally:
+            input_.close()
+
+    def test_stream_multi_string(self):
+        data = (
+            "***D:MULTI-STRING mstr1 boundary1\n"
+            "line 1\n"
+            "line 2\n"
+            "boundary1\n"
+            "***D:MULTI-STRING mstr2 boundary2\n"
+            "line 3\n"
+            "line 4\n"
+            "boundary2\n"
+            "***TERMINATE\n"
+        )
+        parser = self.create_parser(data)
+        parser.stream_multi_string = True
+
+        event = parser.next_event()
+        self._expect_dmstring(event, 'mstr1')
+        self.assertEqual(
+            ['line 1', 'line 2'],
+            list(event[c.ATTRIBUTES_KEY]['value'])
+        )
+
+        # unconsumed lines are skipped
+        event = parser.next_event()
+        self._expect_dmstring(event, 'mstr2')
+        self.assertEqual('line 3', next(event[c.ATTRIBUTES_KEY]['value']))
+
+        event = parser.next_event()
+        self._expect_terminate(event)
+
+    def test_cli_log_to_file(self):
+        data = (
+            "***D:MULTI-STRING log boundary1\n"
+            "line 1\n"
+            "line 2\n"
+            "boundary1\n"
+            "***TERMINATE\n"
+        )
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+        dest = six.StringIO()
+
+        self.assertIsNone(parser.cli_download_log(dest=dest))
+        self.assertEqual("line 1\nline 2\n", dest.getvalue())
+
+        event = parser.next_event()
+        self._expect_terminate(event)
+
+        self._compare_outputs(out, "log\n")
+
+    def test_run(self):
+        data = (
+            "#NOTE\n"
+            "***Q:STRING str1\n"
+            "***L:INFO log record\n"
+            "***Q:MULTI-STRING mstr1 boundary1 boundary2\n"
+            "**%QStart: MyFrame\n"
+            "***Q:VALUE value1\n"
+            "**%QEnd: MyFrame\n"
+            "***CONFIRM confirm1 description 1\n"
+            "***Q:VALUE unknown\n"
+            "***TERMINATE\n"
+            "#NOTE\n"
+        )
+        expected_output = (
+            "value 1\n"
+            "line 1\n"
+            "line 2\n"
+            "boundary1\n"
+            "VALUE value1=int:47\n"
+            "CONFIRM confirm1=yes\n"
+            "ABORT unknown\n"
+        )
+        answers = {
+            (c.QUERY_STRING_EVENT, 'str1'): "value 1",
+            (c.QUERY_MULTI_STRING_EVENT, 'mstr1'): ["line 1", "line 2"],
+            (c.QUERY_VALUE_EVENT, 'value1'): 47,
+            (c.CONFIRM_EVENT, 'confirm1'): True,
+        }
+
+        def fallback(parser, event):
+            self._expect_qvalue(event, 'unknown')
+            event[c.ABORT_KEY] = True
+            parser.send_response(event)
+
+        observed = []
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+
+        event = parser.run(
+            AnswerTable(answers), fallback,
+            lambda parser, event: observed.append(event[c.TYPE_KEY]),
+        )
+        self._expect_terminate(event)
+        self._compare_outputs(out, expected_output)
+        self.assertEqual(observed, [c.NOTE_EVENT, c.LOG_EVENT])
+
+    def test_run_without_answer(self):
+        data = (
+            "***Q:VALUE value1\n"
+            "***TERMINATE\n"
+        )
+        parser = self.create_parser(data, six.StringIO())
+
+        with pytest.raises(e.UnexpectedEventError):
+            parser.run({(c.QUERY_VALUE_EVENT, 'value2'): 1})
+
+    def test_run_answer_not_in_valid_values(self):
+        data = (
+            "**%QStart: MyFrame\n"
+            "**%QValidValues: Yes|No\n"
+            "***Q:STRING str1\n"
+            "**%QEnd: MyFrame\n"
+            "**%QStart: MyFrame\n"
+            "**%QValidValues: 1|2\n"
+            "***Q:VALUE value1\n"
+            "**%QEnd: MyFrame\n"
+            "***TERMINATE\n"
+        )
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+        with pytest.raises(e.InvalidReplyError):
+            parser.run(AnswerTable({(c.QUERY_STRING_EVENT, 'str1'): "maybe"}))
+        self._compare_outputs(out, "")
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+        with pytest.raises(e.InvalidReplyError):
+            parser.run({
+                (c.QUERY_STRING_EVENT, 'str1'): "yes",
+                (c.QUERY_VALUE_EVENT, 'value1'): 3,
+            })
+        self._compare_outputs(out, "yes\n")
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+        event = parser.run({
+            (c.QUERY_STRING_EVENT, 'str1'): "yes",
+            (c.QUERY_VALUE_EVENT, 'value1'): 2,
+        })
+        self._expect_terminate(event)
+        self._compare_outputs(out, "yes\nVALUE value1=int:2\n")
+
+    def test_invalid_answers(self):
+        with pytest.raises(TypeError):
+            AnswerTable({(c.QUERY_STRING_EVENT, 'str1'): "multi\nline"})
+        with pytest.raises(TypeError):
+            AnswerTable({(c.NOTE_EVENT, 'note'): "value"})
+
+    def test_flush_policy(self):
+        class Output(six.StringIO):
+            writes = 0
+            flushes = 0
+
+            def write(self, data):
+                self.writes += 1
+                return six.StringIO.write(self, data)
+
+            def flush(self):
+                self.flushes += 1
+
+        data = (
+            "***Q:STRING prompt\n"
+            "***Q:STRING prompt\n"
+        )
+        expected_output = (
+            "noop\n"
+            "noop\n"
+            "install\n"
+            "quit\n"
+            "noop\n"
+            "abort\n"
+            "noop\n"
+            "noop\n"
+        )
+
+        out = Output()
+        parser = self.create_parser(data, out)
+        parser.cli_noop()
+        self.assertEqual((out.writes, out.flushes), (1, 1))
+
+        with parser.batch():
+            parser.cli_noop()
+            parser.cli_install()
+            parser.cli_quit()
+        self.assertEqual((out.writes, out.flushes), (2, 2))
+
+        parser.flush_policy = c.FLUSH_EXPLICIT
+        parser.cli_noop()
+        parser.cli_abort()
+        self.assertEqual((out.writes, out.flushes), (2, 2))
+        # pending messages are flushed before parser waits for reply
+        self._expect_qstring(parser.next_event(), 'prompt')
+        self.assertEqual((out.writes, out.flushes), (3, 3))
+
+        parser.flush_policy = c.FLUSH_MESSAGE
+        with parser.batch():
+            parser.cli_noop()
+            parser.cli_noop()
+        self.assertEqual((out.writes, out.flushes), (5, 5))
+
+        self._compare_outputs(out, expected_output)
+
+    def test_cli_env_get_many(self):
+        data = (
+            "***D:VALUE key1=str:value1\n"
+            "***Q:STRING prompt\n"
+            "***L:INFO log record\n"
+            "***D:MULTI-STRING key2 boundary1\n"
+            "line 1\n"
+            "boundary1\n"
+            "***Q:STRING prompt\n"
+            "***Q:STRING prompt\n"
+            "***D:VALUE key4=int:4\n"
+            "***Q:STRING prompt\n"
+            "***TERMINATE\n"
+        )
+
+        expected_output = (
+            "env-get -k key1\n"
+            "env-get -k key2\n"
+            "env-get -k key3\n"
+            "env-get -k key4\n"
+        )
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+        parser.stream_multi_string = True
+
+        with pytest.raises(e.UnexpectedEventError) as ex:
+            parser.cli_env_get_many(['key1', 'key2', 'key3', 'key4'])
+        assert ex.value.args[1] == 'key3'
+
+        self._compare_outputs(out, expected_output)
+        self._expect_qstring(parser.next_event(), 'prompt')
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+        self.assertEqual(
+            parser.cli_env_get_many(['key1', 'key2']),
+            {'key1': 'value1', 'key2': ['line 1']},
+        )
+
+    def test_cli_env_get_many_missing_prompt(self):
+        data = (
+            "***D:VALUE key1=str:value1\n"
+            # prompt is expected
+            "***D:VALUE key1=str:value1\n"
+            "***D:VALUE key2=str:value2\n"
+            "***Q:STRING prompt\n"
+        )
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+
+        with pytest.raises(e.UnexpectedEventError) as ex:
+            parser.cli_env_get_many(['key1', 'key2'])
+        assert ex.value.args[0][c.TYPE_KEY] == c.DISPLAY_VALUE_EVENT
+        assert ex.value.args[1] == 'key2'
+
+    def test_cli_env_set_many(self):
+        data = (
+            "***Q:VALUE key1\n"
+            "***Q:STRING prompt\n"
+            "***Q:VALUE key2\n"
+            "***Q:STRING prompt\n"
+            "***Q:MULTI-STRING key3 boundary1 boundary2\n"
+            "***Q:STRING prompt\n"
+            "***Q:VALUE key4\n"
+            "***Q:STRING prompt\n"
+            "***TERMINATE\n"
+        )
+
+        expected_output = (
+            "env-query -k key1\n"
+            "VALUE key1=str:value 1\n"
+            "env-query -k key2\n"
+            "VALUE key2=int:2\n"
+            "env-query-multi -k key3\n"
+            "line 1\n"
+            "boundary1\n"
+            "env-query -k key4\n"
+            "VALUE key4=bool:True\n"
+        )
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+
+        parser.cli_env_set_many([
+            ('key1', 'value 1'),
+            ('key2', 2),
+            ('key3', ['line 1']),
+            ('key4', True),
+        ])
+        self._expect_qstring(parser.next_event(), 'prompt')
+        self._expect_terminate(parser.next_event())
+        self._compare_outputs(out, expected_output)
+
+    def test_cli_env_set_many_refused(self):
+        data = (
+            "***Q:VALUE key1\n"
+            "***Q:STRING prompt\n"
+            # env-query of key2 is refused
+            "***L:ERROR unknown key2\n"
+            "***Q:STRING prompt\n"
+            "***Q:MULTI-STRING key3 boundary1 boundary2\n"
+            "***Q:STRING prompt\n"
+            "***Q:VALUE key4\n"
+            "***Q:STRING prompt\n"
+            "***TERMINATE\n"
+        )
+
+        # nothing is written for key2 before its query arrives
+        expected_output = (
+            "env-query -k key1\n"
+            "VALUE key1=str:value 1\n"
+            "env-query -k key2\n"
+            "env-query-multi -k key3\n"
+            "line 1\n"
+            "boundary1\n"
+            "env-query -k key4\n"
+            "VALUE key4=bool:True\n"
+        )
+
+        out = six.StringIO()
+        parser = self.create_parser(data, out)
+
+        with pytest.raises(e.UnexpectedEventError) as ex:
+            parser.cli_env_set_many([
+                ('key1', 'value 1'),
+                ('key2', 2),
+                ('key3', ['line 1']),
+                ('key4', True),
+            ])
+        assert ex.value.args[1] == 'key2'
+        self._expect_qstring(parser.next_event(), 'prompt')
+        self._expect_terminate(parser.next_event())
+        self._compare_outputs(out, expected_output)
+
+    def test_cli_env_set_many_invalid_value(self):
+        out = six.StringIO()
+        parser = self.create_parser("***Q:VALUE key1\n", out)
+
+        with pytest.raises(TypeError):
+            parser.cli_env_set_many({'key1': 1, 'key2': "new\nline"})
+        self._compare_outputs(out, "")
+
+    def test_env_cache(self):
+        data = (
+            "***D:VALUE key1=str:value1\n"
+            "***Q:STRING prompt\n"
+            "***Q:VALUE key2\n"
+            "***Q:STRING prompt\n"
+            "***D:MULTI-STRING key3 boundary1\n"
+            "line 1\n"
+            "boundary1\n"
+            "***Q:STRING prompt\n"
+            "***D:VALUE key1=str:value2\n"
+            "***Q:STRING prompt\n"
+            "***L:INFO log record\n"
+            "***D:VALUE key1=str:value3\n"
+        )
+
+        expected_output = (
+            "env-get -k key1\n"
+            "env-query -k key2\n"
+            "VALUE key2=int:2\n"
+            "env-get -k key3\n"
+            "install\n"
+            "env-get -k key1\n"
+            "env-get -k key1\n"
+        )
+
+        out = six.StringIO()
+        parser = MachineDialogParser(
+            six.StringIO(data), out,
+            env_cache_size=2,
+            env_cache_invalidated_by=[c.LOG_EVENT],
+        )
+
+        self.assertEqual(parser.cli_env_get('key1'), 'value1')
+        self._expect_qstring(parser.next_event(), 'prompt')
+        parser.cli_env_set('key2', 2)
+        self._expect_qstring(parser.next_event(), 'prompt')
+        self.assertEqual(parser.cli_env_get('key1'), 'value1')
+        self.assertEqual(parser.cli_env_get_many(['key1', 'key2']), {
+            'key1': 'value1', 'key2': 2,
+        })
+
+        # key1 is evicted
+        value = parser.cli_env_get('key3')
+        self.assertEqual(value, ['line 1'])
+        value.append('line 2')
+        self.assertEqual(parser.cli_env_get('key3'), ['line 1'])
+        self.assertNotIn('key1', parser.env_cache)
+        self._expect_qstring(parser.next_event(), 'prompt')
+
+        parser.cli_install()
+        self.assertEqual(len(parser.env_cache), 0)
+        self.assertEqual(parser.cli_env_get('key1'), 'value2')
+        self._expect_qstring(parser.next_event(), 'prompt')
+        self._expect_log(parser.next_event())
+        self.assertEqual(parser.cli_env_get('key1'), 'value3')
+
+        self.assertEqual(parser.env_cache.hits, 4)
+        self.assertEqual(parser.env_cache.misses, 4)
+        self._compare_outputs(out, expected_output)
+
+    def test_bytes_mode(self):
+        data = (
+            u"***L:INFO \u017elu\u0165ou\u010dk\xfd\r\n"
+            u"***D:VALUE num=int:5\n"
+            u"***D:MULTI-STRING mstr boundary1\n"
+            u"k\xf4\u0148\n"
+            u"boundary1\n"
+            u"**%QStart: MyFrame\n"
+            u"**%QDefault: d\xe9fault\n"
+            u"***Q:STRING str1\n"
+            u"**%QEnd: MyFrame\n"
+            u"***CONFIRM what description\n"
+            u"***TERMINATE\n"
+        ).encode('utf-8')
+        for buffer_size in (0, 5, 8192):
+            out = six.BytesIO()
+            parser = MachineDialogParser(
+                six.BytesIO(data), out, buffer_size=buffer_size,
+                encoding='utf-8',
+            )
+            self._expect_log(
+                parser.next_event(), u"\u017elu\u0165ou\u010dk\xfd", 'INFO',
+            )
+            event = parser.next_event()
+            self._expect_dvalue(event, 'num')
+            self.assertEqual(event[c.ATTRIBUTES_KEY]['value'], 5)
+            event = parser.next_event()
+            self._expect_dmstring(event, 'mstr')
+            self.assertEqual(
+                event[c.ATTRIBUTES_KEY]['value'], [u"k\xf4\u0148"],
+            )
+            event = parser.next_event()
+            self._expect_qstring(event, 'str1')
+            self.assertEqual(
+                event[c.ATTRIBUTES_KEY][c.DEFAULT_KEY], u"d\xe9fault",
+            )
+            event[c.REPLY_KEY] = u"\xe1no"
+            parser.send_response(event)
+            event = parser.next_event()
+            self._expect_confirm(event, 'what', 'description')
+            event[c.REPLY_KEY] = True
+            parser.send_response(event)
+            self._expect_terminate(parser.next_event())
+            self.assertEqual(
+                out.getvalue(),
+                u"\xe1no\nCONFIRM what=yes\n".encode('utf-8'),
+            )
+
+    def test_bytes_mode_decoding_errors(self):
+        data = b"***L:INFO \xff\n#\xfe\n"
+        parser = MachineDialogParser(
+            six.BytesIO(data), six.BytesIO(), encoding='utf-8',
+            errors='replace',
+        )
+        self._expect_log(parser.next_event(), u"\ufffd", 'INFO')
+        self._expect_note(parser.next_event(), u"\ufffd")
+
+        # values are decoded when they are accessed
+        parser = MachineDialogParser(
+            six.BytesIO(data), six.BytesIO(), encoding='utf-8',
+        )
+        event = parser.next_event()
+        with pytest.raises(UnicodeDecodeError):
+            event[c.ATTRIBUTES_KEY]
+
+    def test_bytes_mode_reads_available_data(self):
+        read_fd, write_fd = os.pipe()
+        input_ = os.fdopen(read_fd, 'rb')
+        writer = os.fdopen(write_fd, 'wb')
+        parser = MachineDialogParser(input_, six.BytesIO(), encoding='utf-8')
+        try:
+            # read1() returns both lines at once and doesn't wait for more
+            writer.write(b"#NOTE\n***Q:STRING prompt\n")
+            writer.flush()
+            self._expect_note(parser.next_event(), "NOTE")
+            self._expect_qstring(parser.next_event(), 'prompt')
+            writer.close()
+            with pytest.raises(e.UnexpectedEOF):
+                parser.next_line()
+        finally:
+            input_.close()
+
+    def _pipe(self, **kwargs):
+        read_fd, write_fd = os.pipe()
+        input_ = os.fdopen(read_fd, 'r')
+        self.addCleanup(input_.close)
+        writer = os.fdopen(write_fd, 'w')
+        self.addCleanup(writer.close)
+        out = six.StringIO()
+        return MachineDialogParser(input_, out, **kwargs), writer, out
+
+    def test_next_event_timeout(self):
+        parser, writer, _ = self._pipe()
+        with pytest.raises(e.DialogTimeoutError):
+            parser.next_event(timeout=0.01)
+
+        # incomplete frame is kept and completed by next call
+        writer.write("**%QStart: MyFrame\n***Q:STRING str1\n")
+        writer.flush()
+        with pytest.raises(e.DialogTimeoutError):
+            parser.next_event(timeout=0.01)
+        writer.write("**%QEnd: MyFrame\n")
+        writer.flush()
+        event = parser.next_event(timeout=1)
+        self._expect_qstring(event, 'str1')
+        self.assertEqual(event[c.ATTRIBUTES_KEY][c.FRAME_NAME_KEY], 'MyFrame')
+
+        # without timeout it waits
+        writer.write("***TERMINATE\n")
+        writer.close()
+        self._expect_terminate(parser.next_event())
+
+    def test_session_timeout(self):
+        parser, writer, out = self._pipe(session_timeout=0.05)
+        writer.write("***L:INFO record\n")
+        writer.flush()
+        self._expect_log(parser.next_event(timeout=10), 'record', 'INFO')
+        with pytest.raises(e.DialogTimeoutError):
+            parser.cli_env_get('key1')
+        parser.cli_abort()
+        self._compare_outputs(out, "env-get -k key1\nabort\n")
+
+    def test_decoding_of_file_descriptor(self):
+        parser, writer, _ = self._pipe(buffer_size=1)
+        writer.write(u"#\u010d\n")
+        writer.close()
+        self._expect_note(parser.next_event(timeout=1), u"\u010d")
+
+    def test_data_buffered_by_stream(self):
+        for mode, encoding in (('r', None), ('rb', 'utf-8')):
+            for timeout in (None, 1):
+                read_fd, write_fd = os.pipe()
+                os.write(write_fd, b"banner\n#a\n#b\n")
+                os.close(write_fd)
+                input_ = os.fdopen(read_fd, mode)
+                self.addCleanup(input_.close)
+                # caller's read fills buffer of the stream
+                input_.readline()
+                parser = MachineDialogParser(
+                    input_, six.StringIO(), encoding=encoding,
+                )
+                self._expect_note(parser.next_event(timeout=timeout), "a")
+                self._expect_note(parser.next_event(timeout=timeout), "b")
+                with pytest.raises(e.UnexpectedEOF):
+                    parser.next_event(timeout=timeout)
+
+    def test_timeout_without_file_descriptor(self):
+        parser = self.create_parser("#NOTE\n")
+        with pytest.raises(ValueError):
+            parser.next_event(timeout=1)
+        self._expect_note(parser.next_event(), "NOTE")
+
+    def test_recorded_input_timeout(self):
+        parser, writer, _ = self._pipe()
+        recording = six.StringIO()
+        Recorder(recording).wrap(parser)
+        with pytest.raises(e.DialogTimeoutError):
+            parser.next_event(timeout=0.01)
+        writer.write("#NOTE\n")
+        writer.flush()
+        self._expect_note(parser.next_event(timeout=1), "NOTE")
+        assert '#NOTE' in recording.getvalue()
 
 # vim: expandtab tabstop=4 shiftwidth=4
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import pytest
+from otopimdp.protocol import DialogProtocol, NEED_DATA
+from otopimdp import constants as c
+from otopimdp import errors as e
+
+
+DATA = (
+    u"#NOTE\r\n"
+    u"***L:INFO record\n"
+    u"**%QStart: MyFrame\n"
+    u"**%QDefault: one\n"
+    u"***Q:VALUE value1\n"
+    u"**%QValidValues: one|two\n"
+    u"**%QEnd: MyFrame\n"
+    u"garbage\n"
+    u"***D:MULTI-STRING key boundary\n"
+    u"line 1\n"
+    u"line č\n"
+    u"boundary\n"
+    u"***TERMINATE"
+)
+
+
+def check(events):
+    assert [event[c.TYPE_KEY] for event in events] == [
+        c.NOTE_EVENT,
+        c.LOG_EVENT,
+        c.QUERY_VALUE_EVENT,
+        c.DISPLAY_MULTI_STRING_EVENT,
+        c.TERMINATE_EVENT,
+    ]
+    query = events[2][c.ATTRIBUTES_KEY]
+    assert query['name'] == 'value1'
+    assert query[c.DEFAULT_KEY] == 'one'
+    assert query[c.VALID_VALUES_KEY] == ['one', 'two']
+    assert events[3][c.ATTRIBUTES_KEY]['value'] == [u'line 1', u'line č']
+
+
+@pytest.mark.parametrize("encoding", [None, 'utf-8'])
+def test_feed_split_anywhere(encoding):
+    data = DATA if encoding is None else DATA.encode(encoding)
+    for split in range(len(data) + 1):
+        protocol = DialogProtocol(encoding)
+        events = protocol.feed(data[:split])
+        events += protocol.feed(data[split:])
+        events += protocol.feed(data[:0])
+        check(events)
+        assert protocol.idle
+
+
+def test_feed_by_single_characters():
+    protocol = DialogProtocol()
+    events = []
+    for char in DATA:
+        events += protocol.feed(char)
+    events += protocol.feed('')
+    check(events)
+
+
+def test_next_event():
+    protocol = DialogProtocol()
+    assert protocol.next_event() is NEED_DATA
+    protocol.receive_data("garbage\n***L:INFO rec")
+    assert protocol.next_event() is None
+    assert protocol.next_event() is NEED_DATA
+    protocol.receive_data("ord\n")
+    assert protocol.next_event()[c.ATTRIBUTES_KEY]['record'] == 'record'
+    protocol.receive_eof()
+    with pytest.raises(e.UnexpectedEOF):
+        protocol.next_event()
+
+
+def test_streamed_value():
+    protocol = DialogProtocol()
+    protocol.receive_data(
+        "***D:MULTI-STRING key1 boundary\nline 1\nli"
+    )
+    event = protocol.next_event(stream=True)
+    assert event[c.ATTRIBUTES_KEY]['name'] == 'key1'
+    assert protocol.next_value_line() == 'line 1'
+    assert protocol.next_value_line() is NEED_DATA
+    protocol.receive_data("ne 2\nline 3\n")
+    assert protocol.next_value_line() == 'line 2'
+    # unread lines are skipped
+    assert protocol.next_event() is NEED_DATA
+    protocol.receive_data("boundary\n***TERMINATE\n")
+    assert protocol.next_event()[c.TYPE_KEY] == c.TERMINATE_EVENT
+    assert protocol.next_value_line() is None
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_undecodable_boundary(stream):
+    protocol = DialogProtocol('utf-8', errors='replace')
+    protocol.receive_data(
+        b"***D:MULTI-STRING K b\xff\nline\nb\xff\n***TERMINATE\n"
+    )
+    event = protocol.next_event(stream=stream)
+    assert event[c.ATTRIBUTES_KEY]['boundary'] == u'b\ufffd'
+    if stream:
+        assert protocol.next_value_line() == u'line'
+        assert protocol.next_value_line() is None
+    else:
+        assert event[c.ATTRIBUTES_KEY]['value'] == [u'line']
+    protocol.receive_eof()
+    assert protocol.next_event()[c.TYPE_KEY] == c.TERMINATE_EVENT
+
+
+def test_truncated_frame():
+    protocol = DialogProtocol()
+    with pytest.raises(e.UnexpectedEOF):
+        protocol.feed("**%QStart: MyFrame\n***Q:VALUE value1\n")
+        protocol.feed("")
+
+
+def test_invalid_frame_resets_state():
+    protocol = DialogProtocol()
+    with pytest.raises(e.IncompleteQueryFrameError):
+        protocol.feed("**%QStart: MyFrame\n**%QEnd: MyFrame\n")
+    assert protocol.idle
+    assert protocol.feed("#NOTE\n")[0][c.ATTRIBUTES_KEY]['note'] == 'NOTE'
+
+
+@pytest.mark.parametrize("line", [
+    "**%QUnknown: value",
+    "**%QDefault:value",
+    "**%QEnd",
+])
+def test_unknown_frame_directive(line):
+    protocol = DialogProtocol()
+    with pytest.raises(e.UnexpectedInputError):
+        protocol.feed("**%QStart: MyFrame\n" + line + "\n")
+
+
+@pytest.mark.parametrize("encoding", [None, 'utf-8'])
+def test_subscribed_split_anywhere(encoding):
+    # value of skipped multi-string looks like events
+    data = DATA.replace(u"line 1\n", u"***Q:STRING fake\n**%QStart: x\n")
+    if encoding is not None:
+        data = data.encode(encoding)
+    for split in range(len(data) + 1):
+        protocol = DialogProtocol(
+            encoding, subscribed=[c.QUERY_VALUE_EVENT, c.TERMINATE_EVENT],
+        )
+        events = protocol.feed(data[:split])
+        events += protocol.feed(data[split:])
+        events += protocol.feed(data[:0])
+        assert [event[c.TYPE_KEY] for event in events] == [
+            c.QUERY_VALUE_EVENT, c.TERMINATE_EVENT,
+        ]
+        assert events[0][c.ATTRIBUTES_KEY][c.DEFAULT_KEY] == 'one'
+        assert protocol.skipped == 3
+        assert protocol.idle
+
+
+def test_subscribed_framed_query():
+    protocol = DialogProtocol(subscribed=[c.TERMINATE_EVENT])
+    assert protocol.subscribed == frozenset([c.TERMINATE_EVENT])
+    events = protocol.feed(DATA)
+    events += protocol.feed('')
+    assert [event[c.TYPE_KEY] for event in events] == [c.TERMINATE_EVENT]
+    assert protocol.skipped == 4
+
+    protocol.subscribed = None
+    protocol.reset()
+    events = protocol.feed(DATA)
+    events += protocol.feed('')
+    check(events)
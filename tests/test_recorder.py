@@ -0,0 +1,127 @@
+import time
+import six
+import pytest
+from otopimdp.parser import MachineDialogParser
+from otopimdp.recorder import Recorder, Replay, load, INPUT, OUTPUT
+from otopimdp import constants as c
+from otopimdp import errors as e
+
+
+DATA = (
+    "***L:INFO log record\r\n"
+    "***Q:STRING str1\n"
+    "**%QStart: MyFrame\n"
+    "***Q:VALUE value1\n"
+    "**%QEnd: MyFrame\n"
+    "***TERMINATE\n"
+)
+
+
+def answer(parser, value):
+    while True:
+        event = parser.next_event()
+        if event[c.TYPE_KEY] == c.TERMINATE_EVENT:
+            return
+        if event[c.TYPE_KEY] in (c.QUERY_STRING_EVENT, c.QUERY_VALUE_EVENT):
+            event[c.REPLY_KEY] = value
+            parser.send_response(event)
+
+
+def record(data, value):
+    recording = six.StringIO()
+    out = six.StringIO()
+    parser = MachineDialogParser(six.StringIO(data), out)
+    Recorder(recording).wrap(parser)
+    answer(parser, value)
+    recording.seek(0)
+    return load(recording), out.getvalue()
+
+
+def test_record():
+    records, out = record(DATA, 'value')
+    assert out == "value\nVALUE value1=str:value\n"
+    assert ''.join(
+        r['data'] for r in records if r['direction'] == INPUT
+    ) == DATA
+    assert ''.join(
+        r['data'] for r in records if r['direction'] == OUTPUT
+    ) == out
+    times = [r['time'] for r in records]
+    assert times == sorted(times)
+
+
+@pytest.mark.parametrize("buffer_size", [0, 4, 8192])
+def test_replay(buffer_size):
+    records, _ = record(DATA, 'value')
+    replay = Replay(records)
+    parser = MachineDialogParser(buffer_size=buffer_size)
+    replay.attach(parser)
+    answer(parser, 'value')
+    replay.verify()
+
+
+def test_replay_mismatch():
+    records, _ = record(DATA, 'value')
+    replay = Replay(records)
+    parser = MachineDialogParser()
+    replay.attach(parser)
+    with pytest.raises(e.ReplayMismatchError):
+        answer(parser, 'other')
+
+
+def test_replay_missing_reply():
+    records, _ = record(DATA, 'value')
+    replay = Replay(records)
+    parser = MachineDialogParser()
+    replay.attach(parser)
+    parser.next_event()
+    with pytest.raises(e.ReplayMismatchError):
+        replay.verify()
+
+
+def test_paced_replay():
+    records = [
+        {'time': 0.0, 'direction': INPUT, 'data': "#NOTE\n"},
+        {'time': 0.2, 'direction': INPUT, 'data': "***TERMINATE\n"},
+    ]
+    replay = Replay(records, pace=True)
+    parser = MachineDialogParser()
+    replay.attach(parser)
+    start = time.time()
+    parser.next_event()
+    parser.next_event()
+    assert time.time() - start >= 0.2
+
+
+@pytest.mark.parametrize("buffer_size", [0, 8192])
+def test_binary_record_replay(buffer_size):
+    data = (
+        b"***Q:STRING str1\n"
+        b"#\xff\n" +
+        u"#\u017elu\u0165ou\u010dk\xfd k\u016f\u0148\n".encode('utf-8') +
+        b"***TERMINATE\n"
+    )
+    reply = u'h\xe1\u010dek'
+    recording = six.StringIO()
+    out = six.BytesIO()
+    parser = MachineDialogParser(
+        six.BytesIO(data), out, encoding='utf-8', errors='replace',
+    )
+    Recorder(recording).wrap(parser)
+    answer(parser, reply)
+    assert out.getvalue() == (reply + u'\n').encode('utf-8')
+    recording.seek(0)
+    records = load(recording)
+    assert all(r['binary'] for r in records)
+    assert b''.join(
+        r['data'].encode('latin-1')
+        for r in records if r['direction'] == INPUT
+    ) == data
+
+    replay = Replay(records)
+    parser = MachineDialogParser(
+        encoding='utf-8', errors='replace', buffer_size=buffer_size,
+    )
+    replay.attach(parser)
+    answer(parser, reply)
+    replay.verify()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import pytest
+from otopimdp.transcript import TranscriptReader, INDEX_SUFFIX
+from otopimdp import constants as c
+
+
+DATA = (
+    u"***L:INFO log record\n"
+    u"***Q:VALUE value1\n"
+    u"**%QStart: MyFrame\n"
+    u"**%QDefault: one\n"
+    u"***Q:VALUE value1\n"
+    u"**%QEnd: MyFrame\n"
+    u"garbage\n"
+    u"***D:MULTI-STRING mstr1 boundary1\n"
+    u"line č\n"
+    u"boundary1\n"
+    u"***CONFIRM confirm1 description 1\n"
+    u"***TERMINATE"
+)
+
+
+def write(path, data):
+    with open(path, 'wb') as stream:
+        stream.write(data.encode('utf-8'))
+
+
+def test_reader(tmp_path):
+    path = str(tmp_path / 'transcript')
+    write(path, DATA)
+
+    with TranscriptReader(path) as reader:
+        assert len(reader) == 6
+        assert reader.numbers(c.QUERY_VALUE_EVENT, 'value1') == [1, 2]
+        events = list(reader.find(c.QUERY_VALUE_EVENT, 'value1'))
+        assert c.DEFAULT_KEY not in events[0][c.ATTRIBUTES_KEY]
+        assert events[1][c.ATTRIBUTES_KEY][c.DEFAULT_KEY] == 'one'
+        event = reader.event(3)
+        assert event[c.TYPE_KEY] == c.DISPLAY_MULTI_STRING_EVENT
+        assert event[c.ATTRIBUTES_KEY]['value'] == [u'line č']
+        assert reader.numbers(name='confirm1') == [4]
+        assert reader.event(5)[c.TYPE_KEY] == c.TERMINATE_EVENT
+
+    assert os.path.exists(path + INDEX_SUFFIX)
+
+
+def test_index_is_reused(tmp_path):
+    path = str(tmp_path / 'transcript')
+    write(path, DATA)
+    TranscriptReader(path).close()
+
+    index_path = path + INDEX_SUFFIX
+    with open(index_path) as stream:
+        index = json.load(stream)
+    index['offsets'] = index['offsets'][:1]
+    index['event_types'] = index['event_types'][:1]
+    index['event_names'] = index['event_names'][:1]
+    with open(index_path, 'w') as stream:
+        json.dump(index, stream)
+
+    with TranscriptReader(path) as reader:
+        assert len(reader) == 1
+
+    # changed transcript invalidates the index
+    write(path, DATA + u"\n#NOTE\n")
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    with TranscriptReader(path) as reader:
+        assert len(reader) == 7
+        assert reader.event(6)[c.ATTRIBUTES_KEY]['note'] == 'NOTE'
+
+
+def test_empty_transcript(tmp_path):
+    path = str(tmp_path / 'transcript')
+    write(path, u"")
+    with TranscriptReader(path) as reader:
+        assert len(reader) == 0
+        assert list(reader.find()) == []
+
+
+@pytest.mark.parametrize("tail", [
+    u"***D:MULTI-STRING log b\nline\n",
+    u"**%QStart: F\n***Q:VALUE x\n",
+])
+def test_truncated_transcript(tmp_path, tail):
+    path = str(tmp_path / 'transcript')
+    write(path, u"#NOTE\n***L:ERROR failed\n" + tail)
+    with TranscriptReader(path) as reader:
+        assert len(reader) == 2
+        assert reader.numbers(c.LOG_EVENT) == [1]
+        assert reader.event(1)[c.ATTRIBUTES_KEY]['record'] == 'failed'
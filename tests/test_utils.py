@@ -1,5 +1,5 @@
 import pytest
-from otopimdp.utils import split_valid_options
+from otopimdp.utils import split_valid_options, valid_options, LRUCache
 
 
 DATA = [
@@ -8,6 +8,10 @@ DATA = [
     ('one|two|three', ['one', 'two', 'three']),
     ('hello\\|aa|ksjbdkjd|jsbkds', ['hello|aa', 'ksjbdkjd', 'jsbkds']),
     ('\\\\|\\\\|\\|', ['\\', '\\', '|']),
+    ('one|', ['one']),
+    ('|two', ['', 'two']),
+    ('one\\', ['one']),
+    ('\\\\\\|x|y', ['\\|x', 'y']),
 ]
 
 
@@ -21,3 +25,35 @@ def test_negative_case():
     with pytest.raises(ValueError) as ex:
         split_valid_options("abc\\def|foobar")
     assert "Unescaped" in str(ex.value)
+
+
+def test_valid_options_are_memoized():
+    options, valid = valid_options('One|two')
+    assert options == ['One', 'two']
+    assert valid == frozenset(['One', 'one', 'two'])
+    options.append('three')
+    again, valid_again = valid_options('One|two')
+    assert again == ['One', 'two']
+    assert valid_again is valid
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    assert cache.get('a') is LRUCache.MISSING
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    # b is least recently used
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    cache.invalidate('a')
+    assert 'a' not in cache
+    cache.invalidate()
+    assert len(cache) == 0
+
+    with pytest.raises(ValueError):
+        LRUCache(0)